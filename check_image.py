@@ -4,43 +4,21 @@ Checks the existence of a tag in a registry by calling skopeo
 Usage: check_image.py file [regex]
 
 If regex is supplied the path of the image must match this regex
+
+Images tagged with a commit hash which were verified recently are not
+inspected again (see saasherder.cache.ImageDigestCache), set REFRESH to
+inspect all of them.
+
+This is a thin wrapper around saasherder.imagecheck, the same checks are
+available as `saasherder check-images`.
 """
 
 import os
 import re
-import subprocess
 import sys
-import time
-
-import anymarkup
-
-if os.environ.get('AUTH_FILE'):
-    AUTH_FILE = os.environ.get('AUTH_FILE')
-else:
-    AUTH_FILE = os.path.expanduser('~/skopeo.json')
-
-SKOPEO_USER = os.environ.get('SKOPEO_USER')
-SKOPEO_PASS = os.environ.get('SKOPEO_PASS')
-
-
-def skopeo_inspect(image):
-    # try without authentication first
-    cmd = ['skopeo', 'inspect', 'docker://{}'.format(image)]
-    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    stdout, stderr = p.communicate()
-    if p.returncode == 0:
-        return (p.returncode, stdout, stderr)
-
-    # try with authentication
-    if SKOPEO_USER and SKOPEO_PASS:
-        cmd += ['--creds', '{}:{}'.format(SKOPEO_USER, SKOPEO_PASS)]
-    else:
-        cmd += ['--authfile', AUTH_FILE]
-
-    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    stdout, stderr = p.communicate()
-    return (p.returncode, stdout, stderr)
 
+from saasherder.cache import ImageDigestCache
+from saasherder.imagecheck import ImageChecker, template_images, report
 
 try:
     OPENSHIFT_TEMPLATE = sys.argv[1]
@@ -53,45 +31,11 @@ try:
 except IndexError:
     image_path_pattern = None
 
-images = set()
-for i in anymarkup.parse_file(OPENSHIFT_TEMPLATE, force_types=None)["items"]:
-    try:
-        for c in i["spec"]["template"]["spec"]["containers"]:
-            images.add(c["image"])
-    except KeyError:
-        pass
-
-    try:
-        images.add(i["spec"]["image"])
-    except KeyError:
-        pass
-
-success = True
-
-for image in images:
-    if image_path_pattern and not image_path_pattern.search(image):
-        print >>sys.stderr, ["ERROR_NO_MATCH",
-                             image, image_path_pattern.pattern]
-        success = False
-        continue
-
-    attempt = 1
-    max_attemps = 5
-    while True:
-        status_code, stdout, stderr = skopeo_inspect(image)
-        if status_code == 0:
-            print ["OK", image]
-            break
-
-        print >>sys.stderr, ["ERROR", image, stderr]
-        if attempt < max_attemps:
-            time.sleep(attempt)
-            attempt += 1
-        else:
-            success = False
-            break
+checker = ImageChecker(pattern=image_path_pattern,
+                       cache=ImageDigestCache(),
+                       refresh=bool(os.environ.get('REFRESH')))
 
-if not success:
+if not report(checker.check_all(template_images(OPENSHIFT_TEMPLATE))):
     sys.exit(1)
 
 sys.exit(0)
@@ -52,45 +52,73 @@ function git_prep {
     git pull --rebase upstream master
 }
 
-function oc_apply {
-    config=""
-    local dryrun_arg=""
+# applies the processed templates of all the contexts, concurrently.
+# $1 is the environment, $2 the suffix of the processed templates dirs and
+# of the kubeconfigs
+function apply_all {
+    local SAAS_ENV=$1
+    local SUFFIX=$2
+    local APPLY_OPTS=""
+    local KUBECONFIG_PATTERN="${CONF}${SUFFIX}"
 
     if [[ -n "$KUBE_SERVER" && -n "$KUBE_TOKEN" ]]; then
-        config="--server=${KUBE_SERVER} --token=${KUBE_TOKEN}"
-    else
-        [ -n "${2}" ] && config="--config=${2}"
+        APPLY_OPTS="--server=${KUBE_SERVER} --token=${KUBE_TOKEN}"
+    fi
+
+    if [ -n "${CHANGED_ONLY}" ]; then
+        # skip the services whose processed templates did not change since
+        # they were last applied
+        APPLY_OPTS="${APPLY_OPTS} --changed-only"
     fi
 
     if ${DRY_RUN}; then
-        echo "oc $config apply -f $1"
-        dryrun_arg="--dry-run"
+        APPLY_OPTS="${APPLY_OPTS} --dry-run"
+    else
+        if [ -z "${KUBECONFVER}" ]; then
+          KUBECONFIG_PATTERN="/home/`whoami`/.kube/cfg-{context}${SUFFIX}"
+        else
+          KUBECONFIG_PATTERN="/home/`whoami`/.kube/cfg-{context}-${KUBECONFVER}${SUFFIX}"
+        fi
     fi
 
-    oc $config apply ${dryrun_arg} -f $1
+    ${CMD} --all-contexts --environment ${SAAS_ENV} apply ${APPLY_OPTS} --kubeconfig "${KUBECONFIG_PATTERN}" \
+        --input-dir "{context}-${TSTAMP}${SUFFIX}"
 }
 
 function pull_tag {
-    local CONTEXT=$1
-    local PROCESSED_DIR=$2
-    local SAAS_ENV=$3
-
-    local TEMPLATE_DIR=${CONTEXT}-templates
+    local SAAS_ENV=$1
+    local SUFFIX=$2
+    local PULL_RTN=0
 
     if ${DRY_RUN}; then
         LOCAL="--local"
     fi
 
-    # lets clear this out to make sure we always have a
-    # fresh set of templates, and nothing else left behind
-    rm -rf ${TEMPLATE_DIR}; mkdir -p ${TEMPLATE_DIR}
+    for CONTEXT in ${SAAS_CONTEXTS}; do
+        local TEMPLATE_DIR=${CONTEXT}-templates
 
-    if [ -e /home/`whoami`/${CONTEXT}-gh-token-`whoami` ]; then GH_TOKEN=" --token "$(cat /home/`whoami`/${CONTEXT}-gh-token-`whoami`); fi
+        if [ -n "${INCREMENTAL}" ]; then
+            # keep the templates pulled last time, only services whose url, hash
+            # or path changed are downloaded again
+            PULL_OPTS="--incremental"
+            mkdir -p ${TEMPLATE_DIR}
+        else
+            # lets clear this out to make sure we always have a
+            # fresh set of templates, and nothing else left behind
+            PULL_OPTS=""
+            rm -rf ${TEMPLATE_DIR}; mkdir -p ${TEMPLATE_DIR}
+        fi
 
-    ${CMD} --context ${CONTEXT} --environment ${SAAS_ENV} pull $GH_TOKEN
-    PULL_RTN=$?
+        GH_TOKEN=""
+        if [ -e /home/`whoami`/${CONTEXT}-gh-token-`whoami` ]; then GH_TOKEN=" --token "$(cat /home/`whoami`/${CONTEXT}-gh-token-`whoami`); fi
+
+        # the token is per context, so each context is pulled on its own.
+        # --contexts does not change the current context in config.yaml
+        ${CMD} --contexts ${CONTEXT} --environment ${SAAS_ENV} pull ${PULL_OPTS} $GH_TOKEN || PULL_RTN=1
+    done
 
-    ${CMD} --context ${CONTEXT} --environment ${SAAS_ENV} template --filter Route --output-dir ${PROCESSED_DIR} ${LOCAL} tag
+    # all the contexts are processed concurrently in a single run
+    ${CMD} --all-contexts --environment ${SAAS_ENV} template --filter Route --output-dir "{context}-${TSTAMP}${SUFFIX}" ${LOCAL} tag
     PROCESS_RTN=$?
 
     if [ ${PULL_RTN} -ne 0 -o ${PROCESS_RTN} -ne 0 ]; then
@@ -99,11 +127,8 @@ function pull_tag {
     fi
 }
 
-for g in `echo ${SAAS_CONTEXTS}`; do
-    # get some basics in place, no prep in prod deploy
-    CONTEXT=${g}
-
-    if ! ${DRY_RUN}; then
+if ! ${DRY_RUN}; then
+    for CONTEXT in ${SAAS_CONTEXTS}; do
         if [ -z "${KUBECONFVER}" ]; then
           CONF="/home/`whoami`/.kube/cfg-${CONTEXT}"
         else
@@ -112,32 +137,31 @@ for g in `echo ${SAAS_CONTEXTS}`; do
         if [ ! -e ${CONF} ] ; then
             echo "Could not find OpenShift configuration for ${CONTEXT}"; exit 1;
         fi
-    fi
+    done
+fi
 
-    TSTAMPDIR=${CONTEXT}-${TSTAMP}
-    mkdir -p ${TSTAMPDIR}
+pull_tag ${ENVIRONMENT} ""
 
-    pull_tag ${CONTEXT} ${TSTAMPDIR} ${ENVIRONMENT}
+if [ -n "${APPSEC}" ]; then
+    pull_tag "appsec" "-appsec"
+fi
 
-    FAILED=false
-    for f in `ls ${TSTAMPDIR}/*`; do
-        oc_apply $f ${CONF}
-        if [ $? -ne 0 ]; then
-            echo "Failed applying ${f}, failing job"
-            exit 1
-        fi
-    done
+for CONTEXT in ${SAAS_CONTEXTS}; do
+    mkdir -p ${CONTEXT}-${TSTAMP}
+done
 
-    if [ -n "${APPSEC}" ]; then
-        TSTAMPDIR_APPSEC="${CONTEXT}-${TSTAMP}-appsec"
-        mkdir -p ${TSTAMPDIR_APPSEC}
+# every file is applied, failures are reported once all of them are done
+if ! apply_all ${ENVIRONMENT} ""; then
+    echo "Failed applying templates, failing job"
+    exit 1
+fi
 
-        pull_tag ${CONTEXT} ${TSTAMPDIR_APPSEC} "appsec"
+if [ -n "${APPSEC}" ]; then
+    apply_all "appsec" "-appsec"
+fi
 
-        for f in `ls ${TSTAMPDIR_APPSEC}/*`; do
-            oc_apply $f "${CONF}-appsec"
-        done
-    fi
+for CONTEXT in ${SAAS_CONTEXTS}; do
+    TSTAMPDIR=${CONTEXT}-${TSTAMP}
 
     if [ $(find ${TSTAMPDIR}/ -name \*.yaml | wc -l ) -lt 1 ]; then
         # if we didnt apply anything, dont keep the dir around
@@ -145,5 +169,3 @@ for g in `echo ${SAAS_CONTEXTS}`; do
         echo "R: Nothing to apply"
     fi
 done
-
-
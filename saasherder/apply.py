@@ -0,0 +1,117 @@
+"""
+Applies processed templates to clusters
+
+Files are applied concurrently, with at most `jobs` applies running against
+the same cluster at any time, also when several contexts share a cluster.
+Every file is applied even if others fail, and the result of each file is
+collected. The executor is pluggable, OcExecutor (oc apply) is the default.
+"""
+
+import subprocess
+import threading
+from multiprocessing.pool import ThreadPool
+
+import logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# applies running concurrently against one cluster
+DEFAULT_JOBS = 4
+
+
+class ApplyError(Exception):
+    pass
+
+
+class OcExecutor(object):
+    """ Applies files with oc apply. server and token, if given, take
+        precedence over the kubeconfig of the cluster """
+
+    def __init__(self, server=None, token=None):
+        self.server = server
+        self.token = token
+
+    def command(self, path, kubeconfig=None, dry_run=False):
+        cmd = ["oc"]
+        if self.server and self.token:
+            cmd += ["--server=%s" % self.server, "--token=%s" % self.token]
+        elif kubeconfig:
+            cmd += ["--config=%s" % kubeconfig]
+
+        cmd += ["apply"]
+        if dry_run:
+            cmd += ["--dry-run"]
+
+        return cmd + ["-f", path]
+
+    def apply(self, path, kubeconfig=None, dry_run=False):
+        """ Returns the output of oc apply """
+        cmd = self.command(path, kubeconfig, dry_run)
+        logger.debug(" ".join(cmd))
+
+        try:
+            p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        except OSError as e:
+            raise ApplyError("Could not run oc: %s" % e)
+
+        output, _ = p.communicate()
+        if p.returncode != 0:
+            raise ApplyError(output.strip())
+
+        return output
+
+
+class Applier(object):
+    """ Applies files to clusters
+
+        executor: object with an apply(path, kubeconfig=None, dry_run=False)
+        method returning the output and raising ApplyError
+        jobs: number of files applied concurrently per cluster
+        dry_run: passed to the executor, nothing is changed in the clusters
+    """
+
+    def __init__(self, executor=None, jobs=DEFAULT_JOBS, dry_run=False):
+        self.executor = executor or OcExecutor()
+        self.jobs = jobs
+        self.dry_run = dry_run
+
+        # cluster (kubeconfig) -> semaphore limiting its concurrent applies
+        self._clusters = {}
+        self._lock = threading.Lock()
+
+    def cluster_slots(self, kubeconfig):
+        with self._lock:
+            if kubeconfig not in self._clusters:
+                self._clusters[kubeconfig] = threading.BoundedSemaphore(max(self.jobs, 1))
+
+            return self._clusters[kubeconfig]
+
+    def apply(self, path, kubeconfig=None):
+        """ Returns (status, path, detail), status is OK (detail is the output
+            of the executor) or FAILED (detail is the error) """
+        with self.cluster_slots(kubeconfig):
+            try:
+                output = self.executor.apply(path, kubeconfig, dry_run=self.dry_run)
+            except ApplyError as e:
+                logger.error("Applying %s failed: %s" % (path, e))
+                return "FAILED", path, str(e)
+
+        return "OK", path, output
+
+    def apply_files(self, files, kubeconfig=None):
+        """ Applies files to the cluster of kubeconfig, returns the results
+            of apply in the order of files """
+        def apply(path):
+            return self.apply(path, kubeconfig)
+
+        if self.jobs > 1 and len(files) > 1:
+            pool = ThreadPool(min(self.jobs, len(files)))
+            try:
+                results = pool.map(apply, files)
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            results = [apply(path) for path in files]
+
+        return results
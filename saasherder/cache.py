@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# A full commit SHA1 - the content behind it never changes
+COMMIT_HASH_RE = re.compile(r"^[0-9a-f]{40}$")
+
+# An image tag generated from a commit hash (see hash_length), or a digest.
+# A commit tag needs at least one letter: numeric tags are usually build
+# numbers or dates, which get pushed again
+COMMIT_TAG_RE = re.compile(r"(:(?=[0-9]*[a-f])[0-9a-f]{6,40}|@sha256:[0-9a-f]{64})$")
+
+# How long (seconds) a verified image is trusted
+DEFAULT_IMAGE_TTL = 7 * 24 * 3600
+
+# How long (seconds) unused validation results are kept
+DEFAULT_VALIDATION_TTL = 30 * 24 * 3600
+
+
+def default_cache_dir():
+    """ Returns $XDG_CACHE_HOME/saasherder, falling back to ~/.cache/saasherder """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or \
+        os.path.join(os.path.expanduser("~"), ".cache")
+
+    return os.path.join(cache_home, "saasherder")
+
+
+@contextmanager
+def open_atomic(path):
+    """ Opens a temporary file for writing which replaces path once the block
+        completes, so that readers never see a partially written file. The
+        temporary file is removed if the block raises. """
+    dirname = os.path.dirname(path) or os.curdir
+    if not os.path.isdir(dirname):
+        try:
+            os.makedirs(dirname)
+        except OSError:
+            # created concurrently
+            if not os.path.isdir(dirname):
+                raise
+
+    fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w") as fp:
+            yield fp
+        os.rename(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_atomic(path, data):
+    """ Writes data to path so that readers never see a partially written file """
+    with open_atomic(path) as fp:
+        fp.write(data)
+
+
+class TemplateCache(object):
+    """ Persistent cache of downloaded templates, keyed by (url, hash, path) of
+        the service. Templates of services pinned to a full commit hash are
+        immutable and can be served without touching the network. For branch
+        refs the ETag of the response is kept to revalidate the cached copy.
+    """
+
+    def __init__(self, cache_dir=None):
+        if not cache_dir:
+            cache_dir = default_cache_dir()
+
+        self.cache_dir = os.path.join(cache_dir, "templates")
+
+    @staticmethod
+    def is_pinned(service):
+        """ True if the service hash is a full commit hash """
+        return bool(COMMIT_HASH_RE.match(str(service.get("hash"))))
+
+    @staticmethod
+    def key(service):
+        key = "\0".join([str(service.get("url")).rstrip("/"),
+                         str(service.get("hash")),
+                         str(service.get("path")).lstrip("/")])
+
+        return hashlib.sha256(key).hexdigest()
+
+    def path(self, service):
+        return os.path.join(self.cache_dir, "%s.yaml" % self.key(service))
+
+    def get(self, service):
+        """ Returns a tuple (template, etag) for the service. Both values are None
+            if nothing is cached, etag is None if the server did not provide one.
+        """
+        template_path = self.path(service)
+
+        try:
+            with open(template_path) as fp:
+                template = fp.read()
+        except IOError:
+            return None, None
+
+        try:
+            with open(template_path + ".etag") as fp:
+                etag = fp.read()
+        except IOError:
+            etag = None
+
+        return template, etag
+
+    def put(self, service, template, etag=None):
+        """ Stores a template. Branch refs are only worth storing with an etag, as
+            they can't be served without revalidation. """
+        if not self.is_pinned(service) and not etag:
+            return
+
+        template_path = self.path(service)
+        write_atomic(template_path, template)
+
+        if etag:
+            write_atomic(template_path + ".etag", etag)
+        elif os.path.exists(template_path + ".etag"):
+            os.unlink(template_path + ".etag")
+
+
+class ImageDigestCache(object):
+    """ Persistent cache of successful image inspections (image -> digest).
+        Only images tagged with a commit hash (or pinned to a digest) are
+        served from it, other tags like latest can move at any time. Entries
+        expire after ttl seconds.
+    """
+
+    def __init__(self, cache_dir=None, ttl=DEFAULT_IMAGE_TTL):
+        if not cache_dir:
+            cache_dir = default_cache_dir()
+
+        self.path = os.path.join(cache_dir, "images.json")
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._changed = False
+
+        try:
+            with open(self.path) as fp:
+                self.entries = json.load(fp)
+        except (IOError, ValueError):
+            self.entries = {}
+
+    @staticmethod
+    def is_pinned(image):
+        """ True if the image tag is a commit hash or the image is a digest """
+        return bool(COMMIT_TAG_RE.search(image))
+
+    def get(self, image):
+        """ Returns the cached digest of image, or None """
+        if not self.is_pinned(image):
+            return None
+
+        with self._lock:
+            entry = self.entries.get(image)
+
+        if not entry or time.time() - entry["checked"] > self.ttl:
+            return None
+
+        return entry["digest"]
+
+    def put(self, image, digest):
+        with self._lock:
+            self.entries[image] = {"digest": digest, "checked": time.time()}
+            self._changed = True
+
+    def save(self):
+        """ Writes the cache, dropping expired entries """
+        with self._lock:
+            if not self._changed:
+                return
+
+            now = time.time()
+            entries = dict((image, entry) for image, entry in self.entries.items()
+                           if now - entry["checked"] <= self.ttl)
+            write_atomic(self.path, json.dumps(entries, sort_keys=True))
+            self._changed = False
+
+
+class ValidationCache(object):
+    """ Persistent cache of validation results (key -> list of errors). Keys
+        identify the template content and the rules it was validated with
+        (see validation.ValidationEngine), so entries never go stale; those
+        not used for ttl seconds are dropped.
+    """
+
+    def __init__(self, cache_dir=None, ttl=DEFAULT_VALIDATION_TTL):
+        if not cache_dir:
+            cache_dir = default_cache_dir()
+
+        self.path = os.path.join(cache_dir, "validation.json")
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._changed = False
+
+        try:
+            with open(self.path) as fp:
+                self.entries = json.load(fp)
+        except (IOError, ValueError):
+            self.entries = {}
+
+    def get(self, key):
+        """ Returns the cached errors, or None """
+        with self._lock:
+            entry = self.entries.get(key)
+            if not entry:
+                return None
+
+            entry["used"] = time.time()
+            self._changed = True
+
+        return entry["errors"]
+
+    def put(self, key, errors):
+        with self._lock:
+            self.entries[key] = {"errors": errors, "used": time.time()}
+            self._changed = True
+
+    def save(self):
+        """ Writes the cache, dropping entries unused for ttl seconds """
+        with self._lock:
+            if not self._changed:
+                return
+
+            now = time.time()
+            entries = dict((key, entry) for key, entry in self.entries.items()
+                           if now - entry["used"] <= self.ttl)
+            write_atomic(self.path, json.dumps(entries, sort_keys=True))
+            self._changed = False
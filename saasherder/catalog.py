@@ -0,0 +1,86 @@
+import cPickle as pickle
+import hashlib
+import os
+import time
+
+import yamlio
+from cache import default_cache_dir, write_atomic
+
+import logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# files modified more recently than this are not stored, their mtime could
+# still change within the resolution of the filesystem clock
+RACY_SECONDS = 2
+
+
+class ServiceCatalog(object):
+    """ Persistent index of parsed service files. There is one index per
+        services dir, every file in it is re-parsed only when its mtime or
+        size change.
+    """
+
+    VERSION = 1
+
+    def __init__(self, cache_dir=None):
+        if not cache_dir:
+            cache_dir = default_cache_dir()
+
+        self.cache_dir = os.path.join(cache_dir, "catalog")
+
+    def index_path(self, services_dir):
+        key = hashlib.sha256(os.path.abspath(services_dir)).hexdigest()
+        return os.path.join(self.cache_dir, "%s.pickle" % key)
+
+    def load_index(self, services_dir):
+        try:
+            with open(self.index_path(services_dir), "rb") as fp:
+                index = pickle.load(fp)
+        except (IOError, EOFError, pickle.UnpicklingError):
+            return {}
+
+        if index.get("version") != self.VERSION:
+            return {}
+
+        return index["files"]
+
+    def save_index(self, services_dir, files):
+        data = pickle.dumps({"version": self.VERSION, "files": files},
+                            pickle.HIGHEST_PROTOCOL)
+        write_atomic(self.index_path(services_dir), data)
+
+    def parse_files(self, services_dir):
+        """ Returns a list of (file name, parsed content) for the files in
+            services_dir. Unchanged files are served from the index. """
+        index = self.load_index(services_dir)
+
+        files = []
+        stored = {}
+        changed = False
+        now = time.time()
+
+        for f in os.listdir(services_dir):
+            service_file = os.path.join(services_dir, f)
+            st = os.stat(service_file)
+            stamp = (st.st_mtime, st.st_size)
+
+            entry = index.get(f)
+            if entry and entry["stamp"] == stamp:
+                content = entry["content"]
+            else:
+                logger.debug("Parsing changed service file %s" % service_file)
+                content = yamlio.parse_file(service_file)
+                changed = True
+
+            files.append((f, content))
+
+            if now - st.st_mtime > RACY_SECONDS:
+                stored[f] = {"stamp": stamp, "content": content}
+            else:
+                changed = True
+
+        if changed or set(index) != set(stored):
+            self.save_index(services_dir, stored)
+
+        return files
@@ -1,17 +1,29 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
 import logging
 import os
 import re
 import textwrap
 
+from multiprocessing.pool import ThreadPool
 from subprocess import Popen, PIPE
 
 from dateutil.parser import parse
 
+from cache import COMMIT_HASH_RE
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# one git log per range gives the commits to render and the date of the new commit
+LOG_FORMAT = "%H%x00%h%x00%cd%x00%s%x00"
+LOG_FIELDS = ["hash", "short_hash", "date", "subject"]
+
+# git log placeholders used by the commit templates of ChangelogRender
+COMMIT_PLACEHOLDERS = {"%H": "hash", "%h": "short_hash", "%s": "subject"}
+COMMIT_PLACEHOLDER_RE = re.compile("%[Hhs]")
+
 def run(cmd):
     logger.info("$ {}".format(cmd))
     p = Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=PIPE, shell=True)
@@ -22,6 +34,18 @@ def run(cmd):
 
     return stdout.decode('utf-8')
 
+def git(repo, *args):
+    """Run git in repo (without a shell) and return its output"""
+    cmd = ["git", "-C", repo] + list(args)
+    logger.info("$ {}".format(" ".join(cmd)))
+    p = Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=PIPE)
+    stdout, stderr = p.communicate()
+    if p.returncode != 0:
+        raise Exception("$ {} FAILED with exit code {}: {}"
+                        .format(" ".join(cmd), p.returncode, stderr.strip()))
+
+    return stdout.decode('utf-8')
+
 class ChangelogRender(object):
     def __init__(self, changelog, old, new, url=None):
         self.changelog = changelog
@@ -101,6 +125,7 @@ class ChangelogRender(object):
             names_list = "\n".join([names_list_template.format(n) for n in service['names']])
 
             section = section_template.format(name=service['name'],
+                                              names=", ".join(service['names']),
                                               names_list=names_list,
                                               url=url,
                                               old=service['old'],
@@ -115,15 +140,17 @@ class ChangelogRender(object):
         """Get the changelog for one service"""
 
         template = commit_template.format(url=service['url'])
-        git_log_cmd = "git log --encoding=utf-8 --format='{}' {}...{}".format(template, service['old'], service['new'])
 
-        commits = self.changelog.service_run(service, git_log_cmd)
+        commits = ""
+        for commit in service['commits']:
+            line = COMMIT_PLACEHOLDER_RE.sub(lambda m: commit[COMMIT_PLACEHOLDERS[m.group(0)]], template)
+            commits += line + "\n"
 
         return commits.encode('utf-8')
 
     def last_changed(self, service):
         """Get the commit time for service at specific commit"""
-        return self.changelog.service_run(service, "git log -1 --format=%cd {}".format(service['new'])).strip()
+        return service['last_changed']
 
 class Changelog(object):
 
@@ -181,38 +208,90 @@ class Changelog(object):
 
                     changed_services_by_url[url] = diff_item
 
-        self.changed_services = changed_services_by_url.values()
+        # sorted, so that the changelog is rendered in the same order every time
+        self.changed_services = sorted(changed_services_by_url.values(),
+                                       key=lambda s: (s['name'], s['url']))
+
+    def mirror(self, service):
+        """Get the path of the bare mirror of a service repository. Services
+        with the same url share the mirror"""
+        key = hashlib.sha256(service['url'].encode('utf-8')).hexdigest()
+        return os.path.join(self.workspace, 'mirrors', "{}.git".format(key))
 
-    def worktree(self, service):
-        """Get git worktree path for a service"""
-        return os.path.join(self.workspace, service['name'])
+    def _has_commits(self, mirror, revs):
+        """Private; whether all the revs are commits in the mirror"""
+        for rev in revs:
+            try:
+                git(mirror, "cat-file", "-e", "{}^{{commit}}".format(rev))
+            except Exception:
+                return False
+
+        return True
 
-    def service_run(self, service, cmd):
-        """Run in the directory of the service"""
-        return run("cd {} && {}".format(self.worktree(service), cmd))
+    def _fetch(self, mirror, refspecs):
+        """Private; fetch without blobs, the log only needs commits. Falls
+        back to a full fetch when git does not support --filter"""
+        try:
+            git(mirror, "fetch", "--quiet", "--filter=blob:none", "origin", *refspecs)
+        except Exception as e:
+            logger.warning("Fetch without blobs failed ({}), fetching everything".format(e))
+            git(mirror, "fetch", "--quiet", "origin", *refspecs)
 
-    def _clone(self, service):
-        """Private; use checkout instead"""
-        run("git clone {} {}".format(service['url'], self.worktree(service)))
+    def update_mirror(self, service):
+        """Get the mirror of a service repository with the old and new
+        commits of the service. Only the needed refs are fetched"""
 
-    def _fetch(self, service):
-        """Private; use checkout instead"""
-        run("git -C '{}' fetch".format(self.worktree(service)))
+        mirror = self.mirror(service)
+        revs = [service['old'], service['new']]
 
-    def checkout(self, service):
-        """Get a service checked out at specified version"""
+        if not os.path.exists(mirror):
+            logger.info("Creating mirror of {}".format(service['url']))
+            os.makedirs(mirror)
+            git(mirror, "init", "--quiet", "--bare")
+            git(mirror, "remote", "add", "origin", service['url'])
 
-        service_name = service['name']
+        pinned = all(COMMIT_HASH_RE.match(rev) for rev in revs)
 
-        if os.path.exists(self.worktree(service)):
-            logger.info("Found git worktree for {}; updating".format(service_name))
-            self._fetch(service)
-        else:
-            logger.info("Cloning git worktree for {}".format(service_name))
-            self._clone(service)
+        if pinned:
+            if self._has_commits(mirror, revs):
+                logger.info("Mirror of {} is up to date".format(service['url']))
+                return mirror
+
+            # keep the fetched commits under a ref so that gc does not prune them
+            try:
+                self._fetch(mirror, ["{0}:refs/saasherder/{0}".format(rev) for rev in revs])
+                return mirror
+            except Exception:
+                logger.warning("Could not fetch {} by commit, fetching all branches".format(service['url']))
+
+        self._fetch(mirror, ["+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*"])
+
+        return mirror
 
-        return self.service_run(service, "git checkout {}".format(service['new']))
+    def collect(self, service):
+        """Store the commits between the old and new version of a service
+        and the date of the new version in the service"""
 
+        mirror = self.update_mirror(service)
+
+        output = git(mirror, "log", "--encoding=utf-8", "--format={}".format(LOG_FORMAT),
+                     "{}...{}".format(service['old'], service['new']))
+
+        commits = []
+        for line in output.split("\n"):
+            if line:
+                commits.append(dict(zip(LOG_FIELDS, line.split("\x00"))))
+
+        service['commits'] = commits
+
+        # the new commit is part of the range unless it is an ancestor of the old one
+        last_changed = [c['date'] for c in commits if c['hash'].startswith(service['new'])]
+        if last_changed:
+            service['last_changed'] = last_changed[0]
+        else:
+            service['last_changed'] = git(mirror, "log", "-1", "--format=%cd", service['new']).strip()
+
+        return service
 
     def convert_date_to_commit(self, branch, date_or_commit):
         """
@@ -233,7 +312,23 @@ class Changelog(object):
         # Get the first commit before the date
         return run("git -C '{}' rev-list -1 --before='{}' {}".format(self.repo_path, date, branch)).strip()
 
-    def generate(self, context, old, new, out_format):
+    def collect_all(self, jobs=1):
+        """Collect the changes of all the changed services, fetching up to
+        jobs repositories concurrently"""
+        services = self.changed_services
+
+        if jobs > 1 and len(services) > 1:
+            pool = ThreadPool(min(jobs, len(services)))
+            try:
+                pool.map(self.collect, services)
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            for service in services:
+                self.collect(service)
+
+    def generate(self, context, old, new, out_format, jobs=1):
 
         logger.info("Generating changelog for {}".format(context))
 
@@ -242,42 +337,24 @@ class Changelog(object):
         # reading and understanding code much more painful than necessary.
         # `self.config["current"]` and `self.config["contexts"]` can be avoided
         # to make this far simpler.
-        self.saasherder.config.switch_context(context)
-
-        # Where am I right now?
-        try:
-            # This will fail for detached HEAD
-            branch = run("git -C '{}' symbolic-ref --short HEAD".format(self.repo_path)).strip()
-            logger.info("On branch {} before generating changelog"
-                        .format(branch))
-
-        except Exception:
-            branch = run(
-                "git -C '{}' rev-parse --short HEAD".format(self.repo_path)).strip()
-            logger.info("HEAD at {} before generating changelog"
-                        .format(branch))
+        if context:
+            self.saasherder.switch_context(context)
 
         # Convert 'old' and 'new' to commits if they are dates
-        old = self.convert_date_to_commit(branch, old)
-        new = self.convert_date_to_commit(branch, new)
-
-        # Checkout to previous version and get services
-        run("git -C '{}' checkout {}".format(self.repo_path, old))
-        previous, _ = self.saasherder.load_services()
-
-        run("git -C '{}' checkout {}".format(self.repo_path, new))
-        now, _ = self.saasherder.load_services()
+        old = self.convert_date_to_commit("HEAD", old)
+        new = self.convert_date_to_commit("HEAD", new)
 
-        # Go back to where we were
-        run("git -C '{}' checkout {}".format(self.repo_path, branch))
+        # Read the services of both versions straight from git, the working
+        # tree is left alone
+        previous, _ = self.saasherder.load_services(old)
+        now, _ = self.saasherder.load_services(new)
 
         self.fetch_diff(now, previous)
 
         logger.info("{} services changed".format(len(self.changed_services)))
 
         # Fetch all the services that changed
-        for service in self.changed_services:
-            self.checkout(service)
+        self.collect_all(jobs)
 
         url = run("git -C '{}' config --get remote.origin.url".format(self.repo_path))
         url = re.sub(r"(\.git)?(\/)?$", "", url.strip())
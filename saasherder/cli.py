@@ -1,11 +1,205 @@
 #!/usr/bin/env python
 
 import argparse
+import glob
+import json
+import os
+import re
 import sys
+from collections import OrderedDict
 
-from .saasherder import SaasHerder
-from .config import SaasConfig
+from .saasherder import SaasHerder, ProcessingError
+from .apply import Applier, OcExecutor, DEFAULT_JOBS as DEFAULT_APPLY_JOBS
 from .changelog import Changelog
+from .contexts import ContextRunner
+from .inventory import ImageInventory, INVENTORY_FIELDS
+from . import imagecheck
+from .cache import TemplateCache, ImageDigestCache, ValidationCache, DEFAULT_IMAGE_TTL
+from .catalog import ServiceCatalog
+from .manifest import PullManifest, DeployState, sha256sum_file
+from .transport import SessionPool, DEFAULT_POOL_SIZE, DEFAULT_TIMEOUT, DEFAULT_RETRIES
+
+GET_FIELDS = ["name", "path", "url", "hash", "hash_length", "template-url"]
+
+# commands which only switch the context in memory, never writing config.yaml
+READ_ONLY_COMMANDS = ["get", "images", "check-images", "get-services", "config", "changelog", "validate",
+                      "apply"]
+
+# commands which can run in several contexts at once (--contexts/--all-contexts)
+MULTI_CONTEXT_COMMANDS = ["pull", "template", "label", "validate", "apply"]
+
+
+def print_fields(fields, rows, out_format):
+    """ Prints the result of SaasHerder.get_fields as a JSON list or as tab separated values """
+    if out_format == "json":
+        print json.dumps([OrderedDict((f, row[f]) for f in fields) for row in rows],
+                         indent=2, separators=(',', ': '))
+    else:
+        for row in rows:
+            print "\t".join(unicode(row[f]) for f in fields)
+
+
+def context_dir(path, context):
+    """ Replaces {context} in a directory given on the command line """
+    if not path:
+        return path
+
+    return path.format(context=context)
+
+
+def run_pull(se, args, context=None, cache=None):
+    """ Returns whether the pull succeeded and the lines to print """
+    manifest = PullManifest(se.templates_dir)
+    if args.verify:
+        ok, errors = se.verify_templates(args.service, manifest)
+        return ok, ["service: {}: {}".format(service_name, error)
+                    for service_name, error in sorted(errors.items())]
+
+    if args.service:
+        se.collect_services(args.service, args.token, verify_ssl=not args.insecure, jobs=args.jobs,
+                            cache=cache, manifest=manifest, incremental=args.incremental)
+
+    return True, []
+
+
+def state_key(se, args, context=None):
+    """ Key of the context and environment in the DeployState """
+    return DeployState.key(context or se.config.current(), args.environment)
+
+
+def run_template(se, args, context=None, state=None):
+    filters = args.filter.split(",") if args.filter else None
+    try:
+        label_selectors = se.template(args.type, args.services, context_dir(args.output_dir, context), filters,
+                                      force=args.force,
+                                      local=args.local,
+                                      ignore_unknown_parameters=args.ignore_unknown_parameters,
+                                      jobs=args.jobs,
+                                      engine=args.engine,
+                                      label=args.label,
+                                      saas_repo_url=args.saas_repo_url,
+                                      current=args.current,
+                                      print_selectors=False,
+                                      stream=args.stream)
+    except ProcessingError as e:
+        # the failures are logged by process_image_tag
+        return False, e.label_selectors
+
+    if state:
+        # the processed templates are kept, label and apply expect every
+        # service in the output dir; apply --changed-only skips these
+        key = state_key(se, args, context)
+        output_dir = context_dir(args.output_dir, context) or se.output_dir
+        for s in se.get_services(args.services):
+            processed_file = os.path.join(output_dir, "%s.yaml" % s["name"])
+            if os.path.exists(processed_file) and state.is_applied(key, processed_file):
+                print >>sys.stderr, "%s unchanged since it was last applied" % s["name"]
+
+    return True, label_selectors
+
+
+def run_label(se, args, context=None):
+    label_selectors = se.label(args.services, context_dir(args.input_dir, context),
+                               context_dir(args.output_dir, context),
+                               saas_repo_url=args.saas_repo_url, current=args.current,
+                               print_selectors=False, stream=args.stream, jobs=args.jobs)
+
+    return True, label_selectors
+
+
+def run_validate(se, args, context=None, cache=None):
+    ok, errors_dict = se.validate(jobs=args.jobs, cache=cache)
+
+    lines = []
+    for service_name, errors in errors_dict.items():
+        lines.append("service: {}".format(service_name))
+        lines.extend("- {}".format(error) for error in errors)
+
+    return ok, lines
+
+
+def run_apply(se, args, context=None, applier=None, state=None):
+    """ Applies the processed templates of the context, every file is applied
+        even if others fail. With a state, the digests of the applied files are
+        recorded, and files applied before are skipped with --changed-only """
+    input_dir = context_dir(args.input_dir, context) or se.output_dir
+    files = args.files or sorted(glob.glob(os.path.join(input_dir, "*.yaml")))
+
+    key = state_key(se, args, context)
+    digests = {}
+    if state:
+        digests = dict((f, sha256sum_file(f)) for f in files)
+
+    if state and args.changed_only:
+        unchanged = [f for f in files if state.is_applied(key, f, digests[f])]
+        for f in unchanged:
+            print >>sys.stderr, "%s unchanged since it was last applied, skipping" % f
+        files = [f for f in files if f not in unchanged]
+
+    if not files:
+        print >>sys.stderr, "Nothing to apply in %s" % input_dir
+        return True, []
+
+    results = applier.apply_files(files, context_dir(args.kubeconfig, context))
+
+    if state and not applier.dry_run:
+        for status, path, _ in results:
+            if status == "OK":
+                state.record(key, path, digests[path])
+        state.save()
+
+    lines = []
+    for status, path, detail in results:
+        if status == "OK":
+            lines.extend(detail.splitlines())
+        else:
+            lines.append("Failed applying %s" % path)
+
+    return all(status == "OK" for status, _, _ in results), lines
+
+
+def run_contexts(args, command, contexts, **kwargs):
+    """ Runs command in several contexts concurrently and prints the output of
+        every context, in the order of the contexts. Exits with 1 if any of them
+        failed. """
+    runner = ContextRunner(args.config, args.environment,
+                           jobs=args.context_jobs,
+                           catalog=None if args.no_catalog else ServiceCatalog(),
+                           session_pool=kwargs.pop("session_pool", None))
+    contexts = runner.resolve(contexts)
+
+    if len(contexts) > 1:
+        for option in ("output_dir", "input_dir"):
+            path = getattr(args, option, None)
+            if path and "{context}" not in path:
+                raise Exception("--%s must contain {context} when running in several contexts" %
+                                option.replace("_", "-"))
+
+        # the same files would be applied to the cluster of every context
+        if getattr(args, "files", None):
+            raise Exception("Files cannot be given when running in several contexts, "
+                            "use --input-dir with {context}")
+
+    results = runner.run(lambda context, se: command(se, args, context, **kwargs), contexts)
+
+    failed = False
+    for context, result, error in results:
+        # errors are logged by the runner
+        if error:
+            failed = True
+            continue
+
+        ok, lines = result
+        failed = failed or not ok
+
+        if lines and args.command in ("pull", "validate", "apply"):
+            print "context: {}".format(context)
+        for line in lines:
+            print line
+
+    if failed:
+        sys.exit(1)
+
 
 def main():
     parser = argparse.ArgumentParser(description='')
@@ -18,6 +212,15 @@ def main():
                         help='Context to use')
     parser.add_argument('--environment', default=None,
                         help='Environment to use to override service defined values')
+    parser.add_argument('--no-catalog', default=False, action='store_true',
+                        help='Parse all service files instead of using the cached service catalog')
+    parser.add_argument('--contexts', default=None,
+                        help='Comma separated list of contexts to run %s in, concurrently '
+                             'and without changing the current context' % "/".join(MULTI_CONTEXT_COMMANDS))
+    parser.add_argument('--all-contexts', default=False, action='store_true',
+                        help='Like --contexts with all the contexts of the config file')
+    parser.add_argument('--context-jobs', default=None, type=int,
+                        help='Number of contexts run concurrently, all of them by default')
 
     subparsers = parser.add_subparsers(dest="command")
 
@@ -28,6 +231,22 @@ def main():
     subparser_pull.add_argument('service', nargs="*", default="all")
     subparser_pull.add_argument('--token', default=None, help="Token to use when pulling from private repo")
     subparser_pull.add_argument('--insecure', default=False, action='store_true', help="Disable SSL_VERIFY")
+    subparser_pull.add_argument('-j', '--jobs', default=1, type=int,
+                                help="Number of templates to download concurrently")
+    subparser_pull.add_argument('--pool-size', default=DEFAULT_POOL_SIZE, type=int,
+                                help="Number of keep-alive connections kept per host")
+    subparser_pull.add_argument('--timeout', default=DEFAULT_TIMEOUT, type=float,
+                                help="Timeout in seconds for a single HTTP request")
+    subparser_pull.add_argument('--retries', default=DEFAULT_RETRIES, type=int,
+                                help="Number of retries (with exponential backoff) on connection errors, 429 and 5xx")
+    subparser_pull.add_argument('--cache-dir', default=None,
+                                help="Directory of the template cache. Defaults to $XDG_CACHE_HOME/saasherder")
+    subparser_pull.add_argument('--no-cache', default=False, action='store_true',
+                                help="Always download templates, even those pinned to a commit hash")
+    subparser_pull.add_argument('--incremental', default=False, action='store_true',
+                                help="Only download templates whose url, hash or path changed since the last pull")
+    subparser_pull.add_argument('--verify', default=False, action='store_true',
+                                help="Do not download anything, verify pulled templates against the pull manifest")
 
     # subcommand: update
     subparser_update = subparsers.add_parser("update",
@@ -54,9 +273,29 @@ def main():
     subparser_template.add_argument('--ignore-unknown-parameters', default=False, action='store_true',
                         help='If true, will not stop processing if a provided parameter does not exist in the template.')
     subparser_template.add_argument('--output-dir', default=None,
-                        help='Output directory where the updated templates will be stored')
+                        help='Output directory where the updated templates will be stored. '
+                             '{context} is replaced by the context name')
     subparser_template.add_argument('--filter', default=None,
                         help='Comma separated list of kinds you want to filter out')
+    subparser_template.add_argument('-j', '--jobs', default=1, type=int,
+                        help='Number of templates processed concurrently')
+    subparser_template.add_argument('--engine', choices=["oc", "native"], default="oc",
+                        help='Process templates with oc process or with the built-in processor (implies --local)')
+    subparser_template.add_argument('--label', default=False, action='store_true',
+                        help='Also add saasherder labels (like the label command) without re-reading the processed templates')
+    subparser_template.add_argument('--saas-repo-url', default=None,
+                        help='URL of saas repository (used for resource labeling, requires --label)')
+    subparser_template.add_argument('--current', default=False, action='store_true',
+                        help='Print the label selectors of the currently deployed resources (requires --label)')
+    subparser_template.add_argument('--changed-only', default=False, action='store_true',
+                        help='Report the services whose processed template is the same as the one applied '
+                             'last time (recorded by apply, see --state-file)')
+    subparser_template.add_argument('--state-file', default=None,
+                        help='File with the digests of the applied templates. '
+                             'Defaults to $XDG_CACHE_HOME/saasherder/deployed.json')
+    subparser_template.add_argument('--stream', default=False, action='store_true',
+                        help='Filter the output of oc process one object at a time instead of loading it whole '
+                             '(bounded memory for very large templates, ignored with --label and --engine native)')
     subparser_template.add_argument("type", choices=["tag"],
                                     help="Update image tag with commit hash")
     subparser_template.add_argument("services", nargs="*", default="all",
@@ -69,21 +308,77 @@ def main():
     subparser_label.add_argument('--current', default=False, action='store_true',
                         help='Use --current option to get the label selector of the currently deployed resources')
     subparser_label.add_argument('--input-dir', default=None,
-                        help='Input directory where to find processed templates. Defaults to output-dir if not specified')
+                        help='Input directory where to find processed templates. Defaults to output-dir if not specified. '
+                             '{context} is replaced by the context name')
     subparser_label.add_argument('--output-dir', default=None,
-                        help='Output directory where the updated templates will be stored')
+                        help='Output directory where the updated templates will be stored. '
+                             '{context} is replaced by the context name')
     subparser_label.add_argument('--saas-repo-url', default=None,
                         help='URL of saas repository (used for resource labeling)')
+    subparser_label.add_argument('--stream', default=False, action='store_true',
+                        help='Label the templates one object at a time instead of loading them whole '
+                             '(bounded memory for very large templates, same output)')
+    subparser_label.add_argument('-j', '--jobs', default=1, type=int,
+                        help='Number of templates labeled concurrently (in worker processes)')
     subparser_label.add_argument("services", nargs="*", default="all",
                                     help="Service which template should be updated")
 
     # subcommand: get
     subparser_get = subparsers.add_parser("get", help="Extracts info from a service")
 
-    subparser_get.add_argument("type", choices=["path", "url", "hash", "hash_length", "template-url"],
-                                    help="Update image tag with commit hash")
+    subparser_get.add_argument("type", nargs="?",
+                                    help="Field to get, one of: %s. Omit when --fields is used" % ", ".join(GET_FIELDS[1:]))
     subparser_get.add_argument("services", nargs="*", default="all",
                                     help="Services to query")
+    subparser_get.add_argument("--fields", default=None,
+                                    help="Comma separated list of fields (%s) to get for every service at once" % ",".join(GET_FIELDS))
+    subparser_get.add_argument("--format", choices=["json", "tsv"], default="tsv",
+                                    help="Output format used with --fields")
+
+    # subcommand: images
+    subparser_images = subparsers.add_parser("images",
+                                             help="Lists the container images of all services in all contexts")
+    subparser_images.add_argument("--source", choices=["templates", "processed"], default="templates",
+                                  help="Read images from pulled templates (processed in process) or from processed templates")
+    subparser_images.add_argument("--input-dir", default=None,
+                                  help="Directory of processed templates, {context} is replaced by the context name. "
+                                       "Defaults to the output_dir of the context")
+    subparser_images.add_argument("--repo", default=None,
+                                  help="Value of the repo column. Defaults to the name of the saas repo directory")
+    subparser_images.add_argument("--format", choices=["csv", "jsonl"], default="csv",
+                                  help="Semicolon separated rows (%s) or JSON lines" % ";".join(INVENTORY_FIELDS))
+    subparser_images.add_argument('-f', '--force', default=False, action='store_true',
+                                  help="Include services with skip: True")
+    subparser_images.add_argument('-j', '--jobs', default=1, type=int,
+                                  help="Number of services read concurrently")
+    subparser_images.add_argument("contexts", nargs="*", default=None,
+                                  help="Contexts to list, all contexts by default")
+
+    # subcommand: check-images
+    subparser_check_images = subparsers.add_parser("check-images",
+                                                   help="Checks that the images of processed templates exist in their registries")
+    subparser_check_images.add_argument("--pattern", default=None,
+                                        help="Regex the image names must match")
+    subparser_check_images.add_argument('-j', '--jobs', default=imagecheck.DEFAULT_JOBS, type=int,
+                                        help="Number of images inspected concurrently")
+    subparser_check_images.add_argument('--retries', default=imagecheck.DEFAULT_RETRIES, type=int,
+                                        help="Number of retries shared by all the images")
+    subparser_check_images.add_argument('--timeout', default=imagecheck.DEFAULT_TIMEOUT, type=float,
+                                        help="Time in seconds all the retries may take, first attempts are not counted")
+    subparser_check_images.add_argument('--attempt-timeout', default=imagecheck.DEFAULT_ATTEMPT_TIMEOUT, type=float,
+                                        help="Time in seconds a single inspection may take")
+    subparser_check_images.add_argument('--auth-file', default=None,
+                                        help="skopeo auth file, defaults to $AUTH_FILE or ~/skopeo.json")
+    subparser_check_images.add_argument('--cache-dir', default=None,
+                                        help="Directory of the image digest cache. Defaults to $XDG_CACHE_HOME/saasherder")
+    subparser_check_images.add_argument('--cache-ttl', default=DEFAULT_IMAGE_TTL, type=int,
+                                        help="Seconds a verified image tagged with a commit hash is not inspected again")
+    subparser_check_images.add_argument('--refresh', default=False, action='store_true',
+                                        help="Inspect all the images, even those verified before")
+    subparser_check_images.add_argument('--no-cache', default=False, action='store_true',
+                                        help="Neither read nor update the image digest cache")
+    subparser_check_images.add_argument("files", nargs="*",
+                                        help="Processed templates, all the templates of the output dir of the context by default")
 
     # subcommand: get-services
     subparser_get_services = subparsers.add_parser("get-services", help="Get list of services")
@@ -100,66 +395,159 @@ def main():
 
     subparser_changelog.add_argument("--context", action="store")
     subparser_changelog.add_argument("--format", choices=['markdown', 'plain', 'html'], default='plain')
+    subparser_changelog.add_argument("-j", "--jobs", default=4, type=int,
+                                     help="Number of service repositories fetched concurrently")
     subparser_changelog.add_argument("old", action="store", help="Commit or a date (parsed by dateutil.parser)")
     subparser_changelog.add_argument("new", action="store", help="Commit or a date (parsed by dateutil.parser)")
 
     # subcommand: validate
     subparser_validate = subparsers.add_parser("validate")
     subparser_validate.add_argument("--context", action="store")
+    subparser_validate.add_argument("-j", "--jobs", default=1, type=int,
+                                    help="Number of templates validated concurrently (in worker processes)")
+    subparser_validate.add_argument('--cache-dir', default=None,
+                                    help="Directory of the validation cache. Defaults to $XDG_CACHE_HOME/saasherder")
+    subparser_validate.add_argument('--no-cache', default=False, action='store_true',
+                                    help="Validate all the templates, even those validated before")
+
+    # subcommand: apply
+    subparser_apply = subparsers.add_parser("apply",
+                                            help="Applies the processed templates (oc apply), concurrently")
+    subparser_apply.add_argument('--input-dir', default=None,
+                                 help='Directory of the processed templates, the output dir of the context by default. '
+                                      '{context} is replaced by the context name')
+    subparser_apply.add_argument('--kubeconfig', default=None,
+                                 help='Kubeconfig of the cluster. {context} is replaced by the context name')
+    subparser_apply.add_argument('--server', default=None,
+                                 help='API server of the cluster (with --token, overrides --kubeconfig)')
+    subparser_apply.add_argument('--token', default=None,
+                                 help='Token for --server')
+    subparser_apply.add_argument('-j', '--jobs', default=DEFAULT_APPLY_JOBS, type=int,
+                                 help='Number of files applied concurrently per cluster')
+    subparser_apply.add_argument('--dry-run', default=False, action='store_true',
+                                 help='Run oc apply --dry-run, nothing is changed in the cluster')
+    subparser_apply.add_argument('--changed-only', default=False, action='store_true',
+                                 help='Skip the templates which are the same as the ones applied last time')
+    subparser_apply.add_argument('--state-file', default=None,
+                                 help='File with the digests of the applied templates, updated after applying. '
+                                      'Defaults to $XDG_CACHE_HOME/saasherder/deployed.json (with --changed-only)')
+    subparser_apply.add_argument("files", nargs="*",
+                                 help="Processed templates, all the templates of the input dir by default")
 
     # Execute command
     args = parser.parse_args()
 
-    se = SaasHerder(args.config, args.context, args.environment)
+    commands = {"pull": run_pull, "template": run_template, "label": run_label, "validate": run_validate,
+                "apply": run_apply}
 
+    kwargs = {}
     if args.command == "pull":
-        verify_ssl = not args.insecure
-        if args.service:
-            se.collect_services(args.service, args.token, verify_ssl=verify_ssl)
+        kwargs["session_pool"] = SessionPool(pool_size=max(args.pool_size, args.jobs),
+                                             timeout=args.timeout,
+                                             retries=args.retries)
+        kwargs["cache"] = None if args.no_cache else TemplateCache(args.cache_dir)
+    elif args.command == "validate":
+        kwargs["cache"] = None if args.no_cache else ValidationCache(args.cache_dir)
+    elif args.command == "apply":
+        # shared by all the contexts, so the limit per cluster holds across them
+        kwargs["applier"] = Applier(OcExecutor(args.server, args.token),
+                                    jobs=args.jobs, dry_run=args.dry_run)
+
+    if args.command in ("template", "apply") and args.changed_only or \
+            args.command == "apply" and args.state_file:
+        kwargs["state"] = DeployState(args.state_file)
+
+    if args.contexts or args.all_contexts:
+        if args.command not in MULTI_CONTEXT_COMMANDS:
+            parser.error("--contexts/--all-contexts only work with: %s" % ", ".join(MULTI_CONTEXT_COMMANDS))
+
+        contexts = None if args.all_contexts else args.contexts.split(",")
+        run_contexts(args, commands[args.command], contexts, **kwargs)
+        return
+
+    se = SaasHerder(args.config, args.context, args.environment,
+                    persist_context=args.command not in READ_ONLY_COMMANDS)
+    if not args.no_catalog:
+        se.catalog = ServiceCatalog()
+
+    if args.command in commands:
+        if "session_pool" in kwargs:
+            se.session_pool = kwargs.pop("session_pool")
+
+        ok, lines = commands[args.command](se, args, **kwargs)
+        for line in lines:
+            print line
+
+        if not ok:
+            sys.exit(1)
     elif args.command == "update":
         verify_ssl = not args.insecure
         se.update(args.type, args.service, args.value, output_file=args.output_file, verify_ssl=verify_ssl)
-    elif args.command == "template":
-        filters = args.filter.split(",") if args.filter else None
-        se.template(args.type, args.services, args.output_dir, filters,
-                    force=args.force,
-                    local=args.local,
-                    ignore_unknown_parameters=args.ignore_unknown_parameters)
-    elif args.command == "label":
-        se.label(args.services, args.input_dir, args.output_dir,
-                 saas_repo_url=args.saas_repo_url, current=args.current)
-
     elif args.command == "get":
-        for val in se.get(args.type, args.services):
-            print val
+        if args.fields:
+            fields = args.fields.split(",")
+            unknown = [f for f in fields if f not in GET_FIELDS]
+            if unknown:
+                subparser_get.error("unknown fields: %s" % ", ".join(unknown))
+
+            # without a type, the first positional argument is a service
+            services = [args.type] if args.type else []
+            if args.services != "all":
+                services += args.services
+            if not services or services == ["all"]:
+                services = "all"
+
+            print_fields(fields, se.get_fields(fields, services), args.format)
+        else:
+            if args.type not in GET_FIELDS[1:]:
+                subparser_get.error("argument type: invalid choice: %r (choose from %s)" %
+                                    (args.type, ", ".join(GET_FIELDS[1:])))
+            for val in se.get(args.type, args.services):
+                print val
+    elif args.command == "images":
+        inventory = ImageInventory(args.config, args.environment,
+                                   repo=args.repo,
+                                   source=args.source,
+                                   input_dir=args.input_dir,
+                                   force=args.force,
+                                   jobs=args.jobs,
+                                   catalog=se.catalog)
+        for row in inventory.rows(args.contexts):
+            if args.format == "jsonl":
+                print json.dumps(OrderedDict((f, row[f]) for f in INVENTORY_FIELDS))
+            else:
+                print ";".join(unicode(row[f]) for f in INVENTORY_FIELDS)
+            sys.stdout.flush()
+
+        if inventory.failed_contexts:
+            sys.exit(1)
+    elif args.command == "check-images":
+        files = args.files or sorted(glob.glob(os.path.join(se.output_dir, "*.yaml")))
+        images = set()
+        for f in files:
+            images.update(imagecheck.template_images(f))
+
+        checker = imagecheck.ImageChecker(imagecheck.SkopeoInspector(auth_file=args.auth_file),
+                                          jobs=args.jobs,
+                                          retries=args.retries,
+                                          timeout=args.timeout,
+                                          attempt_timeout=args.attempt_timeout,
+                                          pattern=re.compile(args.pattern) if args.pattern else None,
+                                          cache=None if args.no_cache else ImageDigestCache(args.cache_dir, args.cache_ttl),
+                                          refresh=args.refresh)
+        if not imagecheck.report(checker.check_all(images)):
+            sys.exit(1)
     elif args.command == "get-services":
-        if args.context:
-            sc = SaasConfig(args.config)
-            sc.switch_context(args.context)
         for service in se.get_services("all"):
             print service['name']
     elif args.command == "config":
-        sc = SaasConfig(args.config)
+        sc = se.config
         if args.type == "get-contexts":
             for context in sc.get_contexts():
                 print context
     elif args.command == "changelog":
         changelog = Changelog(se)
-        print changelog.generate(args.context, args.old, args.new, args.format)
-    elif args.command == "validate":
-        if args.context:
-            sc = SaasConfig(args.config)
-            sc.switch_context(args.context)
-
-        ok, errors_dict = se.validate()
-
-        if not ok:
-            for service_name, errors in errors_dict.items():
-                print "service: {}".format(service_name)
-                for error in errors:
-                    print "- {}".format(error)
-
-            sys.exit(1)
+        print changelog.generate(args.context, args.old, args.new, args.format, jobs=args.jobs)
 
 
 if __name__ == "__main__":
@@ -1,17 +1,26 @@
+import copy
 import os
-import anymarkup
+
+import yamlio
 
 import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class SaasConfig(object):
-  def __init__(self, path, context=None):
+  def __init__(self, path, context=None, persist=True):
+    """ persist: write context switches to the config file. Otherwise the
+        switch is only an override in this instance and the file is never
+        written (safe for read-only commands and concurrent runs). """
     self.path = path
+    self.persist = persist
     self.load(context)
 
   def load(self, context=None):
-    self.config = anymarkup.parse_file(self.path)
+    self.config = yamlio.parse_file(self.path)
+    # contexts indexed by name, built once instead of scanning on every get()
+    self._contexts = dict((c["name"], c) for c in self.config["contexts"])
+    self._current = None
     if not context:
       context = self.current()
     ctx = self.context_exists(context)
@@ -21,13 +30,10 @@ class SaasConfig(object):
       self.switch_context(context)
 
   def save(self):
-    anymarkup.serialize_file(self.config, self.path)
+    yamlio.serialize_file(self.config, self.path)
 
   def context_exists(self, context):
-    for c in self.config["contexts"]:
-      if context == c["name"]:
-        return c
-    return None
+    return self._contexts.get(context)
 
   def add_context(self, name, services_dir, templates_dir, output_dir):
     c = self.context_exists(name)
@@ -46,22 +52,36 @@ class SaasConfig(object):
 
     if not c:
       self.config["contexts"].append(context)
+      self._contexts[name] = context
 
     self.save()
 
   def switch_context(self, context):
-    if context == self.config["current"]:
+    if context == self.current():
       return
 
     if self.context_exists(context):
-      self.config["current"] = context
-      self.save()
+      if self.persist:
+        self.config["current"] = context
+        self._current = None
+        self.save()
+      else:
+        # in memory only, the parsed config and the file are left untouched
+        self._current = context
       logger.info("Switchted context to %s" % context)
     else:
       raise Exception("Context %s does not exist" % context)
 
+  def for_context(self, context):
+    """ Returns a copy switched to context which shares the parsed config and
+        never writes it back """
+    sc = copy.copy(self)
+    sc.persist = False
+    sc.switch_context(context)
+    return sc
+
   def current(self):
-    return self.config["current"]
+    return self._current or self.config["current"]
 
   def get(self, key):
     context = self.context_exists(self.current())
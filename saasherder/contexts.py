@@ -0,0 +1,80 @@
+from multiprocessing.pool import ThreadPool
+
+from config import SaasConfig
+from saasherder import SaasHerder
+
+import logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ContextRunner(object):
+    """ Runs a command in several contexts within one process. The config file
+        is parsed once, every context gets its own SaasHerder switched in memory
+        (config.yaml is never written) and the contexts run concurrently.
+    """
+
+    def __init__(self, config_path, environment=None, jobs=None, catalog=None, session_pool=None):
+        """ jobs: number of contexts run concurrently, all of them by default
+            catalog, session_pool: shared by the SaasHerder of every context
+        """
+        self.config_path = config_path
+        self.environment = environment
+        self.jobs = jobs
+        self.catalog = catalog
+        self.session_pool = session_pool
+
+        self.config = SaasConfig(config_path, persist=False)
+
+    def resolve(self, contexts=None):
+        """ Returns the given contexts, or all the contexts of the config file """
+        if not contexts:
+            return list(self.config.get_contexts())
+
+        for context in contexts:
+            if not self.config.context_exists(context):
+                raise Exception("Context %s does not exist" % context)
+
+        return list(contexts)
+
+    def herder(self, context):
+        se = SaasHerder(self.config_path, context, self.environment,
+                        config=self.config.for_context(context))
+        se.catalog = self.catalog
+        if self.session_pool:
+            se.session_pool = self.session_pool
+
+        return se
+
+    def run(self, func, contexts=None):
+        """ Calls func(context, se) with the SaasHerder of every context
+
+            Returns a list of (context, result, error) in the order of the
+            contexts. A context which fails (or exits) does not stop the others,
+            its error is returned instead.
+        """
+        contexts = self.resolve(contexts)
+
+        def run_context(context):
+            try:
+                return context, func(context, self.herder(context)), None
+            except SystemExit as e:
+                error = Exception("exited with status %s" % e.code)
+            except Exception as e:
+                error = e
+
+            logger.error("Context %s failed: %s" % (context, error))
+            return context, None, error
+
+        jobs = min(self.jobs or len(contexts), len(contexts))
+        if jobs > 1:
+            pool = ThreadPool(jobs)
+            try:
+                results = pool.map(run_context, contexts)
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            results = [run_context(context) for context in contexts]
+
+        return results
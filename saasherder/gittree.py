@@ -0,0 +1,75 @@
+"""
+Reads files of a git repository at any commit, without checking it out
+
+The files of a directory are listed with git ls-tree and their content is
+streamed from a single git cat-file --batch process, so the working tree is
+never touched and other jobs can keep using the same clone.
+"""
+
+from itertools import izip
+from subprocess import Popen, PIPE
+
+import logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def list_files(path, ref):
+    """ Returns a list of (file name, blob hash) of the files in directory
+        path at ref. Subdirectories are skipped. """
+    cmd = ["git", "-C", path, "ls-tree", "-z", ref, "--", "."]
+    logger.info("$ {}".format(" ".join(cmd)))
+
+    p = Popen(cmd, stdout=PIPE, stderr=PIPE)
+    stdout, stderr = p.communicate()
+    if p.returncode != 0:
+        raise Exception("$ {} FAILED with exit code {}: {}"
+                        .format(" ".join(cmd), p.returncode, stderr.strip()))
+
+    files = []
+    for entry in stdout.split("\0"):
+        if not entry:
+            continue
+
+        info, name = entry.split("\t", 1)
+        _, obj_type, obj_hash = info.split()
+        if obj_type == "blob":
+            files.append((name, obj_hash))
+
+    return files
+
+
+def read_blobs(path, hashes):
+    """ Yields (blob hash, content) for every hash, read one by one from a
+        single git cat-file --batch process """
+    cmd = ["git", "-C", path, "cat-file", "--batch"]
+    p = Popen(cmd, stdin=PIPE, stdout=PIPE)
+
+    try:
+        for obj_hash in hashes:
+            p.stdin.write(obj_hash + "\n")
+            p.stdin.flush()
+
+            header = p.stdout.readline().split()
+            if len(header) != 3:
+                raise Exception("git cat-file could not read {}: {}".format(obj_hash, " ".join(header)))
+
+            size = int(header[2])
+            content = p.stdout.read(size)
+            p.stdout.read(1)  # trailing newline
+
+            yield obj_hash, content
+    finally:
+        p.stdin.close()
+        p.stdout.close()
+        p.wait()
+
+
+def read_files(path, ref):
+    """ Yields (file name, content) for the files in directory path at ref,
+        sorted by name """
+    files = sorted(list_files(path, ref))
+    blobs = read_blobs(path, [obj_hash for _, obj_hash in files])
+
+    for (name, _), (_, content) in izip(files, blobs):
+        yield name, content
@@ -0,0 +1,258 @@
+"""
+Checks that the images used by processed templates exist in their registries
+
+Images are inspected concurrently. Whether a registry needs authentication is
+remembered, so credentials are tried once per registry instead of once per
+image, and all the retries of a run share one retry and time budget. First
+attempts are not charged to the budget, so every image is inspected however
+long the others take. The inspector is pluggable, SkopeoInspector is the
+default.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+import images
+import yamlio
+
+import logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOBS = 8
+DEFAULT_RETRIES = 10
+# seconds of retries (backoff and inspections) shared by all the images
+DEFAULT_TIMEOUT = 600
+# seconds for a single inspection
+DEFAULT_ATTEMPT_TIMEOUT = 120
+
+# attempts per image, within the budget
+MAX_ATTEMPTS = 5
+
+DEFAULT_REGISTRY = "docker.io"
+
+
+class ImageInspectError(Exception):
+    """ retryable: False when retrying cannot help (e.g. the tag does not exist) """
+
+    def __init__(self, message, retryable=True):
+        super(ImageInspectError, self).__init__(message)
+        self.retryable = retryable
+
+
+class SkopeoInspector(object):
+    """ Inspects images with skopeo. Credentials default to $SKOPEO_USER and
+        $SKOPEO_PASS, or to the auth file $AUTH_FILE (~/skopeo.json) """
+
+    def __init__(self, auth_file=None, user=None, password=None):
+        self.auth_file = auth_file or os.environ.get('AUTH_FILE') or os.path.expanduser('~/skopeo.json')
+        self.user = user or os.environ.get('SKOPEO_USER')
+        self.password = password or os.environ.get('SKOPEO_PASS')
+
+    def inspect(self, image, auth=False, timeout=None):
+        """ Returns the digest of image """
+        cmd = ['skopeo']
+        if timeout:
+            cmd += ['--command-timeout', '{}s'.format(int(timeout) + 1)]
+        cmd += ['inspect', 'docker://{}'.format(image)]
+
+        if auth:
+            if self.user and self.password:
+                cmd += ['--creds', '{}:{}'.format(self.user, self.password)]
+            else:
+                cmd += ['--authfile', self.auth_file]
+
+        try:
+            p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            raise ImageInspectError("Could not run skopeo: %s" % e, retryable=False)
+
+        stdout, stderr = p.communicate()
+        if p.returncode != 0:
+            raise ImageInspectError(stderr.strip(), retryable="manifest unknown" not in stderr)
+
+        return json.loads(stdout).get("Digest")
+
+
+class RetryBudget(object):
+    """ Number of retries and time spent retrying shared by all the checks of
+        a run """
+
+    def __init__(self, retries=DEFAULT_RETRIES, timeout=DEFAULT_TIMEOUT):
+        self.retries = retries
+        self.timeout = timeout
+        self.spent = 0
+        self._lock = threading.Lock()
+
+    def remaining(self):
+        """ Seconds of retries left """
+        return max(self.timeout - self.spent, 0)
+
+    def charge(self, seconds):
+        """ Records time spent retrying """
+        with self._lock:
+            self.spent += seconds
+
+    def take(self):
+        """ Takes one retry from the budget, returns False when it is spent """
+        with self._lock:
+            if self.retries <= 0 or not self.remaining():
+                return False
+
+            self.retries -= 1
+            return True
+
+
+def registry(image):
+    """ Returns the registry host of image """
+    name = image.split("/")[0]
+    if "/" in image and ("." in name or ":" in name or name == "localhost"):
+        return name
+
+    return DEFAULT_REGISTRY
+
+
+def template_images(path):
+    """ Returns the set of images of a processed template """
+    return images.all_images(yamlio.parse_file(path, force_types=None)["items"])
+
+
+class ImageChecker(object):
+    """ Checks a set of images concurrently
+
+        inspector: object with an inspect(image, auth=False, timeout=None)
+        method returning the image digest and raising ImageInspectError
+        pattern: compiled regex the image names must match
+        backoff: an image is retried after attempt * backoff seconds
+        cache: optional ImageDigestCache, verified images tagged with a
+        commit hash are not inspected again
+        refresh: inspect all the images, refreshing the cache
+        retries, timeout: budget of retries and seconds spent retrying
+        shared by all the images (see RetryBudget)
+        attempt_timeout: seconds for a single inspection
+    """
+
+    def __init__(self, inspector=None, jobs=DEFAULT_JOBS, retries=DEFAULT_RETRIES,
+                 timeout=DEFAULT_TIMEOUT, pattern=None, backoff=1, cache=None, refresh=False,
+                 attempt_timeout=DEFAULT_ATTEMPT_TIMEOUT):
+        self.inspector = inspector or SkopeoInspector()
+        self.jobs = jobs
+        self.retries = retries
+        self.timeout = timeout
+        self.attempt_timeout = attempt_timeout
+        self.pattern = pattern
+        self.backoff = backoff
+        self.cache = cache
+        self.refresh = refresh
+
+        # registry -> True once it required authentication
+        self._needs_auth = {}
+        self._lock = threading.Lock()
+
+    def inspect(self, image, timeout):
+        """ Inspects image without authentication, then with it, unless the
+            registry is already known to require it """
+        host = registry(image)
+
+        with self._lock:
+            needs_auth = self._needs_auth.get(host)
+
+        if not needs_auth:
+            try:
+                return self.inspector.inspect(image, timeout=timeout)
+            except ImageInspectError as e:
+                logger.debug("Inspecting %s without authentication failed: %s" % (image, e))
+
+        digest = self.inspector.inspect(image, auth=True, timeout=timeout)
+
+        if not needs_auth:
+            with self._lock:
+                self._needs_auth[host] = True
+
+        return digest
+
+    def check(self, image, budget):
+        """ Returns (status, image, detail), status is one of OK (detail is
+            the digest), ERROR or ERROR_NO_MATCH """
+        if self.pattern and not self.pattern.search(image):
+            return "ERROR_NO_MATCH", image, self.pattern.pattern
+
+        if self.cache and not self.refresh:
+            digest = self.cache.get(image)
+            if digest:
+                logger.debug("%s already verified" % image)
+                return "OK", image, digest
+
+        attempt = 1
+        timeout = self.attempt_timeout
+        while True:
+            started = time.time()
+            try:
+                digest = self.inspect(image, timeout)
+            except ImageInspectError as e:
+                error = e
+            else:
+                if self.cache:
+                    self.cache.put(image, digest)
+                return "OK", image, digest
+            finally:
+                # only retries are charged to the budget
+                if attempt > 1:
+                    budget.charge(time.time() - started)
+
+            logger.warning("Inspecting %s failed (attempt %s): %s" % (image, attempt, error))
+
+            if not error.retryable or attempt >= MAX_ATTEMPTS or not budget.take():
+                return "ERROR", image, str(error)
+
+            delay = min(attempt * self.backoff, budget.remaining())
+            time.sleep(delay)
+            budget.charge(delay)
+
+            if not budget.remaining():
+                return "ERROR", image, "retry time budget exhausted: %s" % error
+
+            timeout = min(self.attempt_timeout, budget.remaining())
+            attempt += 1
+
+    def check_all(self, images):
+        """ Returns the results of check for every image, sorted by image """
+        images = sorted(set(images))
+        budget = RetryBudget(self.retries, self.timeout)
+
+        def check(image):
+            return self.check(image, budget)
+
+        if self.jobs > 1 and len(images) > 1:
+            pool = ThreadPool(min(self.jobs, len(images)))
+            try:
+                results = pool.map(check, images)
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            results = [check(image) for image in images]
+
+        if self.cache:
+            self.cache.save()
+
+        return results
+
+
+def report(results):
+    """ Prints the results like check_image.py always did, returns True if all
+        the images are fine """
+    success = True
+    for status, image, detail in results:
+        if status == "OK":
+            print ["OK", image]
+        else:
+            print >>sys.stderr, [status, image, detail]
+            success = False
+
+    return success
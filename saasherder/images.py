@@ -0,0 +1,156 @@
+"""
+Finds pod templates, containers and images in OpenShift/Kubernetes objects
+
+Where images can be is described by a table of kind -> paths, compiled once,
+so every object is visited once by following the paths of its kind instead of
+probing it with try/except. Kinds missing from the table are searched in the
+places the generic controllers use (spec.template, spec.jobTemplate).
+"""
+
+WILDCARD = "*"
+
+# kind -> paths of the pod templates. An empty path is the object itself
+POD_TEMPLATE_PATHS = {
+    "Pod": [""],
+    "DeploymentConfig": ["spec.template"],
+    "Deployment": ["spec.template"],
+    "ReplicaSet": ["spec.template"],
+    "ReplicationController": ["spec.template"],
+    "StatefulSet": ["spec.template"],
+    "DaemonSet": ["spec.template"],
+    "Job": ["spec.template"],
+    "CronJob": ["spec.jobTemplate.spec.template"],
+}
+
+DEFAULT_POD_TEMPLATE_PATHS = ["spec.template", "spec.jobTemplate.spec.template"]
+
+# paths of the containers within a pod template
+CONTAINER_PATHS = ["spec.containers.*"]
+INIT_CONTAINER_PATHS = ["spec.initContainers.*"]
+
+# kind -> paths of object references ({kind: DockerImage, name: <image>})
+IMAGE_REFERENCE_PATHS = {
+    "BuildConfig": ["spec.output.to",
+                    "spec.strategy.dockerStrategy.from",
+                    "spec.strategy.sourceStrategy.from",
+                    "spec.strategy.customStrategy.from"],
+    "ImageStream": ["spec.tags.*.from"],
+}
+
+# paths of plain image names in objects of any kind (e.g. CatalogSource)
+IMAGE_PATHS = ["spec.image"]
+
+
+def compile_path(path):
+    return tuple(path.split(".")) if path else ()
+
+
+def compile_paths(paths):
+    return [compile_path(p) for p in paths]
+
+
+def compile_table(table):
+    return dict((kind, compile_paths(paths)) for kind, paths in table.items())
+
+
+_POD_TEMPLATE_PATHS = compile_table(POD_TEMPLATE_PATHS)
+_DEFAULT_POD_TEMPLATE_PATHS = compile_paths(DEFAULT_POD_TEMPLATE_PATHS)
+_CONTAINER_PATHS = compile_paths(CONTAINER_PATHS)
+_ALL_CONTAINER_PATHS = compile_paths(CONTAINER_PATHS + INIT_CONTAINER_PATHS)
+_IMAGE_REFERENCE_PATHS = compile_table(IMAGE_REFERENCE_PATHS)
+_IMAGE_PATHS = compile_paths(IMAGE_PATHS)
+
+
+def resolve(obj, path):
+    """ Returns the list of values at path in obj. "*" matches all the items
+        of a list, missing keys and values of the wrong type match nothing """
+    values = [obj]
+
+    for key in path:
+        found = []
+        for value in values:
+            if key == WILDCARD:
+                if isinstance(value, list):
+                    found.extend(value)
+            elif isinstance(value, dict):
+                v = value.get(key)
+                if v is not None:
+                    found.append(v)
+
+        if not found:
+            return found
+        values = found
+
+    return values
+
+
+def resolve_all(obj, paths):
+    values = []
+    for path in paths:
+        values.extend(resolve(obj, path))
+
+    return values
+
+
+def pod_templates(obj):
+    """ Returns the pod templates of an object (a Pod is its own template) """
+    paths = _POD_TEMPLATE_PATHS.get(obj.get("kind"), _DEFAULT_POD_TEMPLATE_PATHS)
+
+    return [t for t in resolve_all(obj, paths) if isinstance(t, dict)]
+
+
+def containers(obj, init=True):
+    """ Returns the containers (and init containers, unless init is False)
+        of the pod templates of an object """
+    paths = _ALL_CONTAINER_PATHS if init else _CONTAINER_PATHS
+
+    result = []
+    for template in pod_templates(obj):
+        result.extend(c for c in resolve_all(template, paths) if isinstance(c, dict))
+
+    return result
+
+
+def object_images(obj):
+    """ Returns the list of images used by an object: container and init
+        container images, DockerImage references (BuildConfig, ImageStream)
+        and spec.image """
+    result = [c.get("image") for c in containers(obj)]
+
+    for ref in resolve_all(obj, _IMAGE_REFERENCE_PATHS.get(obj.get("kind"), [])):
+        if isinstance(ref, dict) and ref.get("kind") == "DockerImage":
+            result.append(ref.get("name"))
+
+    result.extend(resolve_all(obj, _IMAGE_PATHS))
+
+    return [i for i in result if i and isinstance(i, basestring)]
+
+
+def all_images(objects):
+    """ Returns the set of images used by a list of objects """
+    result = set()
+    for obj in objects:
+        if isinstance(obj, dict):
+            result.update(object_images(obj))
+
+    return result
+
+
+def container_images(objects):
+    """ Returns the sorted list of container (and init container) images of a
+        list of objects """
+    result = set()
+    for obj in objects:
+        if isinstance(obj, dict):
+            result.update(c.get("image") for c in containers(obj) if c.get("image"))
+
+    return sorted(result)
+
+
+def objects_by_kind(objects):
+    """ Returns a dictionary kind -> list of objects """
+    index = {}
+    for obj in objects:
+        index.setdefault(obj.get("kind"), []).append(obj)
+
+    return index
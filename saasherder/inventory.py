@@ -0,0 +1,166 @@
+import os
+import threading
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+import yamlio
+from config import SaasConfig
+from images import container_images
+from processor import TemplateProcessor
+from saasherder import SaasHerder
+
+import logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INVENTORY_FIELDS = ["repo", "context", "service", "url", "hash", "image"]
+
+# parsed templates kept in memory
+DEFAULT_PARSED_CACHE_SIZE = 64
+
+
+class ImageInventory(object):
+    """ Lists the container images of all the services of a saas repo, across
+        contexts. Images are read either from the pulled templates, which are
+        processed in process (no oc needed), or from already processed templates.
+    """
+
+    def __init__(self, config_path, environment=None, repo=None, source="templates",
+                 input_dir=None, force=False, jobs=1, catalog=None,
+                 cache_size=DEFAULT_PARSED_CACHE_SIZE):
+        """ source: "templates" or "processed"
+            input_dir: directory of the processed templates, "{context}" is
+            replaced with the context name. Defaults to the context output_dir.
+            cache_size: number of parsed templates kept in memory
+        """
+        self.config_path = config_path
+        self.environment = environment
+        self.source = source
+        self.input_dir = input_dir
+        self.force = force
+        self.jobs = jobs
+        self.catalog = catalog
+        self.cache_size = cache_size
+
+        if not repo:
+            repo = os.path.basename(os.path.abspath(os.path.dirname(config_path) or '.'))
+        self.repo = repo
+
+        self.processor = TemplateProcessor(ignore_unknown_parameters=True)
+
+        # parsed once, every context is switched to in memory
+        self.config = SaasConfig(config_path, persist=False)
+
+        # parsed templates shared by all contexts, keyed by (url, hash, path)
+        # of the service, least recently used first
+        self._parsed = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.failed_contexts = []
+
+    def parse_template(self, s, path):
+        """ Parses the template of service s. Services of several contexts
+            pinned to the same template at the same hash share one parse; at
+            most cache_size templates are kept. """
+        key = (s.get("url"), s.get("hash"), s.get("path"))
+
+        with self._lock:
+            if key in self._parsed:
+                data = self._parsed.pop(key)
+                self._parsed[key] = data
+                return data
+
+        data = yamlio.parse_file(path, force_types=None)
+
+        with self._lock:
+            self._parsed[key] = data
+            while len(self._parsed) > self.cache_size:
+                self._parsed.popitem(last=False)
+
+        return data
+
+    def get_input_dir(self, se, context):
+        if self.input_dir:
+            return self.input_dir.format(context=context)
+
+        return se.output_dir
+
+    def service_images(self, se, context, s):
+        """ Returns the images of a single service """
+        if self.source == "processed":
+            path = os.path.join(self.get_input_dir(se, context), "%s.yaml" % s["name"])
+            if not os.path.exists(path):
+                logger.warning("Processed template %s not found, skipping %s" % (path, s["name"]))
+                return []
+
+            # processed templates differ per context, nothing to share
+            objects = yamlio.parse_file(path, force_types=None).get("items") or []
+        else:
+            path = se.get_template_file(s)
+            if not os.path.exists(path):
+                logger.warning("Template %s not found, skipping %s (run pull first)" % (path, s["name"]))
+                return []
+
+            processed = self.processor.process(self.parse_template(s, path),
+                                               se.get_template_parameters(s))
+            objects = processed["items"]
+
+        return container_images(objects)
+
+    def context_rows(self, context):
+        se = SaasHerder(self.config_path, context, self.environment,
+                        config=self.config.for_context(context))
+        se.catalog = self.catalog
+
+        services = [s for s in sorted(se.get_services("all"), key=lambda s: s["name"])
+                    if s.get("hash") and (self.force or not s.get("skip"))]
+
+        def images(s):
+            """ Returns the service, its images and whether listing them failed """
+            try:
+                return s, self.service_images(se, context, s), False
+            except Exception as e:
+                logger.error("Listing images of %s in context %s failed: %s" % (s["name"], context, e))
+                return s, [], True
+
+        pool = None
+        if self.jobs > 1 and len(services) > 1:
+            pool = ThreadPool(min(self.jobs, len(services)))
+            results = pool.imap(images, services)
+        else:
+            results = (images(s) for s in services)
+
+        failed = False
+        try:
+            for s, service_images, service_failed in results:
+                failed = failed or service_failed
+                for image in service_images:
+                    yield {"repo": self.repo,
+                           "context": context,
+                           "service": s["name"],
+                           "url": s.get("url"),
+                           "hash": s.get("hash"),
+                           "image": image}
+        finally:
+            if pool:
+                pool.terminate()
+                pool.join()
+
+        # the other services are listed, the context still fails
+        if failed:
+            self.failed_contexts.append(context)
+
+    def rows(self, contexts=None):
+        """ Yields one dictionary (INVENTORY_FIELDS) per image, context by
+            context. Contexts which fail, or in which the images of a service
+            could not be listed, are logged and recorded in failed_contexts. """
+        if not contexts:
+            contexts = list(self.config.get_contexts())
+
+        for context in contexts:
+            try:
+                for row in self.context_rows(context):
+                    yield row
+            except Exception as e:
+                logger.error("Listing images of context %s failed: %s" % (context, e))
+                self.failed_contexts.append(context)
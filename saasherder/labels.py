@@ -0,0 +1,158 @@
+"""
+saasherder labels of processed templates
+
+Pure functions of their arguments, kept at module level so that templates can
+be labeled in worker processes (see SaasHerder.label with jobs).
+"""
+
+import hashlib
+
+import images
+import yamlio
+from cache import open_atomic
+from manifest import sha256sum_file
+
+import logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def sha256sum_short(data):
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def sha256sum_short_file(path):
+    """ sha256sum_short of the content of a file, read in chunks """
+    return sha256sum_file(path)[:10]
+
+
+def saasherder_labels(context, service_name, digest=None, saas_repo_url=None, pod_labels=False):
+    """ Labels of the objects of a service, or of its pods with pod_labels.
+        digest is the data-sha256sum of the processed template """
+    labels = {}
+    labels['saasherder.context'] = context
+    labels['saasherder.service'] = service_name
+    if pod_labels:
+        return labels
+
+    labels['saasherder.data-sha256sum'] = digest
+    if saas_repo_url:
+        labels['saasherder.saas-repo-url-sha256sum'] = \
+            sha256sum_short(saas_repo_url)
+
+    return labels
+
+
+def format_label_selector(labels, current=True):
+    label_selector = ''
+    for k, v in labels.items():
+        comma = "," if label_selector else ""
+        label_selector = "%s%s%s==%s" % (label_selector, comma, k, v)
+    if not current:
+        label_selector = label_selector.replace('data-sha256sum==', 'data-sha256sum!=')
+
+    return label_selector
+
+
+def label_set(context, service_name, digest, saas_repo_url=None, current=True):
+    """ Returns the labels, the pod labels and the label selector of a service
+        whose processed template has the data-sha256sum digest. They are all
+        derived from the one digest, so a template is hashed once per service,
+        however many objects and pod templates it has. """
+    labels = saasherder_labels(context, service_name, digest, saas_repo_url)
+    pod_labels = saasherder_labels(context, service_name, pod_labels=True)
+
+    return labels, pod_labels, format_label_selector(labels, current)
+
+
+def add_object_labels(obj, labels, pod_labels):
+    """ Adds saasherder labels to one object and its pod templates (in place) """
+    # add labels for label selector filtering
+    object_labels = obj['metadata'].setdefault('labels', {})
+    for k, v in labels.items():
+        object_labels[k] = v
+
+    # apply pod labels where applicable
+    for template in images.pod_templates(obj):
+        template_labels = template.setdefault('metadata', {}).setdefault('labels', {})
+        for k, v in pod_labels.items():
+            template_labels[k] = v
+
+    return obj
+
+
+def add_labels(data_obj, labels, pod_labels):
+    """ Adds saasherder labels to all the objects of a processed template (in place) """
+    for obj in data_obj.get("items", []):
+        add_object_labels(obj, labels, pod_labels)
+
+    return data_obj
+
+
+def stream_objects(input_fp, output_fp, template_filter=None,
+                   labels=None, pod_labels=None, block_strings=False):
+    """ Streaming version of filtering and add_labels: copies a processed
+        template from input_fp to output_fp one object at a time, so only the
+        largest object is ever held in memory. The output is the same as
+        loading, filtering, labeling and dumping the whole template. """
+    removed = False
+    with yamlio.ListWriter(output_fp, block_strings=block_strings) as writer:
+        for kind, value in yamlio.iter_list(input_fp):
+            if kind == yamlio.FIELD:
+                writer.write_field(*value)
+                continue
+
+            if template_filter and value.get("kind") in template_filter:
+                removed = True
+                continue
+
+            if labels:
+                add_object_labels(value, labels, pod_labels)
+
+            writer.write_item(value)
+
+    if removed:
+        logger.info("Removing %s from template." % " and ".join(template_filter))
+
+
+def label_file(input_path, output_path, context, service_name, saas_repo_url=None,
+               current=False, stream=False):
+    """ Labels a processed template, returns its label selector. input_path
+        and output_path may be the same file.
+
+        stream: the data-sha256sum is computed while reading the input in
+        chunks and the objects are labeled one at a time (see stream_objects)
+        instead of loading the template whole. The output is the same.
+    """
+    if stream:
+        labels, pod_labels, label_selector = \
+            label_set(context, service_name, sha256sum_short_file(input_path),
+                      saas_repo_url, current=current)
+
+        with open(input_path, "r") as input_file:
+            with open_atomic(output_path) as output_file:
+                stream_objects(input_file, output_file,
+                               labels=labels,
+                               pod_labels=pod_labels,
+                               block_strings=True)
+
+        return label_selector
+
+    with open(input_path, "r") as input_file:
+        data = input_file.read()
+
+    labels, pod_labels, label_selector = \
+        label_set(context, service_name, sha256sum_short(data), saas_repo_url, current=current)
+    data_obj = add_labels(yamlio.load(data), labels, pod_labels)
+    # the text is not needed once parsed
+    del data
+
+    with open(output_path, "w") as output_file:
+        yamlio.dump(data_obj, output_file, block_strings=True)
+
+    return label_selector
+
+
+def label_file_task(args):
+    """ label_file for Pool.map, args is the tuple of its arguments """
+    return label_file(*args)
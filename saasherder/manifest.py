@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import threading
+
+from cache import TemplateCache, default_cache_dir, write_atomic
+
+import logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def sha256sum_file(path, chunk_size=1024 * 1024):
+    """ Returns the sha256 hex digest of a file without reading it into memory """
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class PullManifest(object):
+    """ Records which url, hash and path produced each pulled template, together
+        with the digest of its content. It is stored next to the templates dir
+        (<templates_dir>.manifest.json) so that it survives the templates dir
+        being wiped.
+    """
+
+    def __init__(self, templates_dir):
+        self.path = "%s.manifest.json" % templates_dir.rstrip(os.sep)
+        self.entries = {}
+        self._lock = threading.Lock()
+
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            self.entries = {}
+            return
+
+        with open(self.path) as fp:
+            self.entries = json.load(fp)
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self.entries, indent=2, sort_keys=True)
+
+        write_atomic(self.path, data + "\n")
+
+    @staticmethod
+    def source(service):
+        """ The part of a service definition which determines its template """
+        return {"url": service.get("url"),
+                "hash": service.get("hash"),
+                "path": service.get("path")}
+
+    def record(self, service, template):
+        entry = self.source(service)
+        entry["sha256"] = hashlib.sha256(template).hexdigest()
+
+        with self._lock:
+            self.entries[service["name"]] = entry
+
+    def forget_others(self, service_names):
+        """ Drops entries of services which are not in service_names """
+        with self._lock:
+            for name in set(self.entries) - set(service_names):
+                del self.entries[name]
+
+    def verify(self, service, template_file):
+        """ Re-hashes a pulled template against the manifest. Returns an error
+            message, or None if the template is the one recorded for the service.
+        """
+        entry = self.entries.get(service["name"])
+
+        if not entry:
+            return "not recorded in the manifest"
+
+        for key, value in self.source(service).items():
+            if entry.get(key) != value:
+                return "%s changed from %s to %s" % (key, entry.get(key), value)
+
+        if not os.path.exists(template_file):
+            return "template %s is missing" % template_file
+
+        if sha256sum_file(template_file) != entry["sha256"]:
+            return "template %s does not match the manifest" % template_file
+
+        return None
+
+    def is_current(self, service, template_file):
+        """ True if the pulled template can be reused as is. Only templates pinned
+            to a commit hash qualify, branch refs can move at any time. """
+        return TemplateCache.is_pinned(service) and \
+            self.verify(service, template_file) is None
+
+
+class DeployState(object):
+    """ Records the digest of the last applied processed template of every
+        service, per context and environment, so that services whose processed
+        template did not change since can be skipped. Stored as JSON, in
+        $XDG_CACHE_HOME/saasherder/deployed.json by default.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(default_cache_dir(), "deployed.json")
+        self.entries = {}
+        self._lock = threading.Lock()
+
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            self.entries = {}
+            return
+
+        with open(self.path) as fp:
+            self.entries = json.load(fp)
+
+    def save(self):
+        # contexts applied concurrently save in turn, the last write has it all
+        with self._lock:
+            data = json.dumps(self.entries, indent=2, sort_keys=True)
+            write_atomic(self.path, data + "\n")
+
+    @staticmethod
+    def key(context, environment=None):
+        return "%s/%s" % (context, environment) if environment else context
+
+    @staticmethod
+    def name(processed_file):
+        """ Processed templates are named after their service """
+        return os.path.splitext(os.path.basename(processed_file))[0]
+
+    def is_applied(self, key, processed_file, digest=None):
+        """ True if processed_file is the last template applied for its
+            service. digest is computed if not given. """
+        with self._lock:
+            applied = self.entries.get(key, {}).get(self.name(processed_file))
+
+        if not applied:
+            return False
+
+        return (digest or sha256sum_file(processed_file)) == applied
+
+    def record(self, key, processed_file, digest=None):
+        digest = digest or sha256sum_file(processed_file)
+
+        with self._lock:
+            self.entries.setdefault(key, {})[self.name(processed_file)] = digest
@@ -0,0 +1,228 @@
+"""
+In-process implementation of `oc process --local`
+
+Substitutes ${PARAM} and ${{PARAM}} references in the objects of an OpenShift
+template, following the rules of the OpenShift template processor:
+
+- a value passed by the caller wins over the template default
+- parameters without a value and with `generate: expression` are generated
+  from their `from` expression
+- parameters marked `required` must end up with a non-empty value
+- passing a parameter the template does not define is an error unless unknown
+  parameters are ignored
+- ${PARAM} is always replaced as a string, a field containing ${{PARAM}} is
+  parsed as JSON after substitution, so it can become a number, bool or object
+- the template labels are added to every object, replacing labels of the
+  same name
+- a hardcoded metadata.namespace is removed, a namespace referencing a
+  parameter is kept (and substituted)
+"""
+
+import json
+import random
+import re
+import string
+
+import yamlio
+
+import logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PARAMETER_RE = re.compile(r"\$\{([a-zA-Z0-9_]+?)\}")
+NONSTRING_PARAMETER_RE = re.compile(r"\$\{\{([a-zA-Z0-9_]+?)\}\}")
+
+# character classes understood by the expression generator
+EXPRESSION_CLASSES = {
+    "w": string.ascii_letters + string.digits + "_",
+    "d": string.digits,
+    "a": string.ascii_letters,
+    "A": string.punctuation,
+}
+
+EXPRESSION_RANGE_RE = re.compile(r"(.)-(.)")
+
+
+class TemplateProcessingError(Exception):
+    pass
+
+
+def _expression_class(spec):
+    """ Expands the content of [...] (ranges and \\w, \\d, \\a, \\A) to a string of characters """
+    chars = ""
+    pos = 0
+
+    while pos < len(spec):
+        if spec[pos] == "\\" and pos + 1 < len(spec):
+            escaped = spec[pos + 1]
+            chars += EXPRESSION_CLASSES.get(escaped, escaped)
+            pos += 2
+            continue
+
+        match = EXPRESSION_RANGE_RE.match(spec, pos)
+        if match:
+            start, end = match.groups()
+            if ord(start) > ord(end):
+                raise TemplateProcessingError("Invalid range %s in expression" % match.group(0))
+            chars += "".join(chr(c) for c in range(ord(start), ord(end) + 1))
+            pos = match.end()
+            continue
+
+        chars += spec[pos]
+        pos += 1
+
+    return chars
+
+
+def generate_expression(expression, rand=None):
+    """ Generates a value from an expression like "[a-zA-Z0-9]{16}" or "\\w{8}" """
+    rand = rand or random.SystemRandom()
+
+    result = ""
+    pos = 0
+
+    while pos < len(expression):
+        char = expression[pos]
+
+        if char == "[":
+            end = expression.find("]", pos + 1)
+            if end == -1:
+                raise TemplateProcessingError("Unterminated character class in expression %s" % expression)
+            chars = _expression_class(expression[pos + 1:end])
+            pos = end + 1
+        elif char == "\\" and pos + 1 < len(expression):
+            escaped = expression[pos + 1]
+            chars = EXPRESSION_CLASSES.get(escaped, escaped)
+            pos += 2
+        else:
+            chars = char
+            pos += 1
+
+        count = 1
+        if pos < len(expression) and expression[pos] == "{":
+            end = expression.find("}", pos)
+            if end == -1 or not expression[pos + 1:end].isdigit():
+                raise TemplateProcessingError("Invalid quantifier in expression %s" % expression)
+            count = int(expression[pos + 1:end])
+            pos = end + 1
+
+        if not chars:
+            raise TemplateProcessingError("Empty character class in expression %s" % expression)
+
+        result += "".join(rand.choice(chars) for _ in range(count))
+
+    return result
+
+
+class TemplateProcessor(object):
+    """ Processes OpenShift templates without calling oc """
+
+    def __init__(self, ignore_unknown_parameters=False):
+        self.ignore_unknown_parameters = ignore_unknown_parameters
+
+    def resolve_parameters(self, template, parameters):
+        """ Returns a dictionary with the final value of every template parameter
+
+            parameters: list of {"name": ..., "value": ...} as passed to oc process
+        """
+        defined = template.get("parameters") or []
+        defined_names = set(p["name"] for p in defined)
+
+        provided = {}
+        for p in parameters:
+            if p["name"] not in defined_names:
+                if self.ignore_unknown_parameters:
+                    continue
+                raise TemplateProcessingError(
+                    "unknown parameter name \"%s\"" % p["name"])
+            provided[p["name"]] = p["value"]
+
+        values = {}
+        for p in defined:
+            name = p["name"]
+
+            if name in provided:
+                value = provided[name]
+            else:
+                value = p.get("value")
+                if not value and p.get("generate"):
+                    if p["generate"] != "expression":
+                        raise TemplateProcessingError(
+                            "parameter %s: unknown generator \"%s\"" % (name, p["generate"]))
+                    value = generate_expression(p.get("from", ""))
+
+            value = u"" if value is None else unicode(value)
+
+            if p.get("required") and not value:
+                raise TemplateProcessingError(
+                    "parameter %s is required and must be specified" % name)
+
+            values[name] = value
+
+        return values
+
+    def substitute(self, value, values):
+        """ Substitutes parameter references in a single string """
+
+        def replace(match):
+            name = match.group(1)
+            return values[name] if name in values else match.group(0)
+
+        new_value, nonstring_count = NONSTRING_PARAMETER_RE.subn(replace, value)
+        new_value = PARAMETER_RE.sub(replace, new_value)
+
+        if nonstring_count and new_value != value:
+            try:
+                return json.loads(new_value)
+            except ValueError:
+                pass
+
+        return new_value
+
+    def visit(self, obj, values):
+        """ Returns a copy of obj with every string substituted """
+        if isinstance(obj, dict):
+            return dict((k, self.visit(v, values)) for k, v in obj.items())
+        elif isinstance(obj, list):
+            return [self.visit(i, values) for i in obj]
+        elif isinstance(obj, basestring) and "${" in obj:
+            return self.substitute(obj, values)
+
+        return obj
+
+    @staticmethod
+    def is_parameterized(value):
+        return isinstance(value, basestring) and \
+            bool(PARAMETER_RE.search(value) or NONSTRING_PARAMETER_RE.search(value))
+
+    def process(self, template, parameters):
+        """ Returns the processed template as a List object, like oc process does """
+        values = self.resolve_parameters(template, parameters)
+        template_labels = self.visit(template.get("labels") or {}, values)
+
+        items = []
+        for obj in template.get("objects") or []:
+            metadata = obj.get("metadata") or {}
+            if "namespace" in metadata and not self.is_parameterized(metadata["namespace"]):
+                obj = dict(obj, metadata=dict((k, v) for k, v in metadata.items() if k != "namespace"))
+
+            obj = self.visit(obj, values)
+
+            if template_labels:
+                metadata = obj.setdefault("metadata", {})
+                labels = metadata.get("labels") or {}
+                labels.update(template_labels)
+                metadata["labels"] = labels
+
+            items.append(obj)
+
+        return {"apiVersion": "v1", "kind": "List", "metadata": {}, "items": items}
+
+    def process_file(self, template_file, parameters):
+        with open(template_file) as fp:
+            template = yamlio.load(fp)
+
+        try:
+            return self.process(template, parameters)
+        except TemplateProcessingError as e:
+            raise TemplateProcessingError("%s: %s" % (template_file, e))
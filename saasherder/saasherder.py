@@ -1,27 +1,47 @@
 import copy
-import hashlib
 import json
 import os
 import subprocess
 import sys
 from distutils.spawn import find_executable
-from shutil import copyfile
-
-import anymarkup
-import requests
-import yaml
+from multiprocessing.pool import ThreadPool
+from shutil import copyfile, copyfileobj
 
+from cache import open_atomic
 from config import SaasConfig
-from validation import VALIDATION_RULES
+import gittree
+import labels
+from labels import stream_objects
+from processor import TemplateProcessor, TemplateProcessingError
+from transport import SessionPool
+from validation import ValidationEngine
+import workers
+import yamlio
 
 import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+class ProcessingError(Exception):
+    """ Some services could not be processed. failures is a list of (service
+        name, error), label_selectors those of the processed services """
+
+    def __init__(self, failures, label_selectors=None):
+        super(ProcessingError, self).__init__(
+            "Processing failed for: %s" % ", ".join(name for name, _ in failures))
+        self.failures = failures
+        self.label_selectors = label_selectors or []
+
+
 class SaasHerder(object):
 
-    def __init__(self, config_path, context, environment=None):
-        self.config = SaasConfig(config_path, context)
+    def __init__(self, config_path, context, environment=None, persist_context=True, config=None):
+        """ config: already parsed SaasConfig to use instead of reading config_path """
+        if config:
+            self.config = config
+        else:
+            self.config = SaasConfig(config_path, context, persist=persist_context)
 
         config_dirname = os.path.dirname(config_path)
         self.repo_path = config_dirname if config_dirname else '.'
@@ -33,6 +53,13 @@ class SaasHerder(object):
 
         self._default_hash_length = 6
         self._services = None
+
+        # shared HTTP connections used to download templates
+        self.session_pool = SessionPool()
+
+        # optional ServiceCatalog to avoid re-parsing unchanged service files
+        self.catalog = None
+
         self._environment = None
 
         if environment and environment != "None":
@@ -40,6 +67,15 @@ class SaasHerder(object):
 
         self.load_from_config()
 
+    def switch_context(self, context):
+        """ Switches to another context (in memory unless the config persists
+            context switches) and reloads the directories of the context """
+        self.config.switch_context(context)
+        logger.info("Current context: %s" % self.config.current())
+
+        self._services = None
+        self.load_from_config()
+
     # TODO: This function should take context or "all" as an argument instead of the
     # hidden the implicit state. Zen of Python says "Explicit is better than
     # implicit."
@@ -51,20 +87,29 @@ class SaasHerder(object):
 
         return self._services
 
-    def load_services(self):
+    def load_services(self, ref=None):
         """ Returns two dictionaries that contain all the services:
           1. Service indexed by service name
           2. List of services indexed by service file. Note that there may be multiple services
             defined in a single service file.
+
+            ref: read the service files as of this commit of the saas repo
+            (through git, without checking it out) instead of from disk
         """
 
         _services = {}
         _service_files = {}
 
-        for f in os.listdir(self.services_dir):
-            service_file = os.path.join(self.services_dir, f)
-            service = anymarkup.parse_file(service_file)
+        if ref:
+            parsed_files = [(f, yamlio.parse(content, f))
+                            for f, content in gittree.read_files(self.services_dir, ref)]
+        elif self.catalog:
+            parsed_files = self.catalog.parse_files(self.services_dir)
+        else:
+            parsed_files = [(f, yamlio.parse_file(os.path.join(self.services_dir, f)))
+                            for f in os.listdir(self.services_dir)]
 
+        for f, service in parsed_files:
             for s in service["services"]:
                 s["file"] = f
                 self.apply_environment_config(s)
@@ -116,8 +161,8 @@ class SaasHerder(object):
         if not found:
             logger.warning("Could not find given environment %s. Proceeding with top level values." % self._environment)
 
-    def apply_filter(self, template_filter, data):
-        data_obj = yaml.safe_load(data)
+    def filter_objects(self, template_filter, data_obj):
+        """ Removes the objects of the kinds in template_filter from a processed template """
         to_delete = []
         if data_obj.get("items"):
             for obj in data_obj.get("items"):
@@ -130,7 +175,19 @@ class SaasHerder(object):
         for obj in to_delete:
             data_obj["items"].remove(obj)
 
-        return yaml.dump(data_obj, encoding='utf-8', default_flow_style=False)
+        return data_obj
+
+    def apply_filter(self, template_filter, data):
+        data_obj = self.filter_objects(template_filter, yamlio.load(data))
+
+        return yamlio.dump(data_obj)
+
+    def stream_objects(self, input_fp, output_fp, template_filter=None,
+                       labels=None, pod_labels=None, block_strings=False):
+        """ Streaming version of filter_objects and add_saasherder_labels (see
+            labels.stream_objects) """
+        return stream_objects(input_fp, output_fp, template_filter, labels, pod_labels,
+                              block_strings=block_strings)
 
     def write_service_file(self, name, output=None):
         """ Writes service file to disk, either to original file name, or to a name
@@ -147,7 +204,7 @@ class SaasHerder(object):
         if not output:
             output = self.services[name]["file"]
 
-        anymarkup.serialize_file(service_file_cont, output)
+        yamlio.serialize_file(service_file_cont, output)
         logger.info("Services written to file %s." % output)
 
     def mkdir_templates_dir(self):
@@ -237,11 +294,22 @@ class SaasHerder(object):
 
         return result
 
-    def download_template(self, s, token, verify_ssl=True):
-        """ Returns a string containing the template of a service """
+    def download_template(self, s, token, verify_ssl=True, cache=None):
+        """ Returns a string containing the template of a service
+
+            cache: optional TemplateCache. Templates pinned to a commit hash are
+            served from it without network access, cached templates of branch
+            refs are revalidated with If-None-Match.
+        """
         url = self.get_raw(s)
 
-        logger.info("Downloading: %s" % self.get_raw(s))
+        cached, etag = cache.get(s) if cache else (None, None)
+
+        if cached is not None and cache.is_pinned(s):
+            logger.info("Using cached template: %s" % url)
+            return cached
+
+        logger.info("Downloading: %s" % url)
 
         headers = {}
 
@@ -249,38 +317,114 @@ class SaasHerder(object):
             headers = {"Authorization": "token %s" % token,
                        "Accept": "application/vnd.github.v3.raw"}
 
-        r = requests.get(url, headers=headers, verify=verify_ssl)
+        if cached is not None and etag:
+            headers["If-None-Match"] = etag
+
+        r = self.session_pool.get(url, headers=headers, verify=verify_ssl)
+
+        if r.status_code == 304 and cached is not None:
+            logger.info("Cached template is up to date: %s" % url)
+            return cached
 
         if r.status_code != 200:
-            raise Exception("Couldn't pull the template.")
+            raise Exception("Couldn't pull the template (HTTP %s)." % r.status_code)
+
+        if cache:
+            cache.put(s, r.content, r.headers.get("ETag"))
 
         return r.content
 
-    def collect_services(self, service_names, token=None, dry_run=False, fail_on_error=False, verify_ssl=True):
-        """ Download templates from repositories """
+    def collect_service(self, s, token=None, dry_run=False, verify_ssl=True, cache=None):
+        """ Download the template of a single service and write it to templates_dir """
+        logger.info("Service: %s" % s.get("name"))
+
+        template = self.download_template(s, token, verify_ssl=verify_ssl, cache=cache)
+
+        if not dry_run:
+            filename = self.get_template_file(s)
+
+            with open(filename, "w") as fp:
+                fp.write(template)
+
+            logger.info("Template written to %s" % filename)
+
+        return template
+
+    def collect_services(self, service_names, token=None, dry_run=False, fail_on_error=False, verify_ssl=True,
+                         jobs=1, cache=None, manifest=None, incremental=False):
+        """ Download templates from repositories
+
+            jobs: number of templates downloaded concurrently. Each template is
+            written as soon as its download finishes.
+            cache: optional TemplateCache to serve and store templates
+            manifest: optional PullManifest recording what produced each template
+            incremental: skip services whose template in templates_dir matches
+            the manifest entry (requires manifest)
+        """
         service_list = self.get_services(service_names)
 
-        for s in service_list:
-            logger.info("Service: %s" % s.get("name"))
+        if incremental and manifest:
+            outdated = [s for s in service_list
+                        if not manifest.is_current(s, self.get_template_file(s))]
+            logger.info("%s of %s templates are up to date" %
+                        (len(service_list) - len(outdated), len(service_list)))
+            service_list = outdated
 
+        def collect(s):
             try:
-                template = self.download_template(s, token, verify_ssl=verify_ssl)
-            except Exception as e:
-                logger.error(e)
+                template = self.collect_service(s, token, dry_run=dry_run, verify_ssl=verify_ssl, cache=cache)
+            except Exception:
+                # the traceback of the worker thread, to re-raise it here
+                return s, sys.exc_info()
+
+            if manifest and not dry_run:
+                manifest.record(s, template)
+
+            return s, None
+
+        pool = None
+        if jobs > 1 and len(service_list) > 1:
+            pool = ThreadPool(min(jobs, len(service_list)))
+            results = pool.imap_unordered(collect, service_list)
+        else:
+            results = (collect(s) for s in service_list)
+
+        try:
+            for s, exc_info in results:
+                if exc_info is None:
+                    continue
+
+                logger.error(exc_info[1])
                 logger.warning("Skipping %s" % s.get("name"))
 
                 if fail_on_error:
-                    raise
+                    raise exc_info[0], exc_info[1], exc_info[2]
+        finally:
+            if pool:
+                pool.terminate()
+                pool.join()
 
-                continue
+            if manifest and not dry_run:
+                if service_names == "all":
+                    manifest.forget_others(self.services.keys())
+                manifest.save()
+
+    def verify_templates(self, service_names, manifest):
+        """ Re-hashes pulled templates against the manifest
 
-            if not dry_run:
-                filename = self.get_template_file(s)
+            Returns two values: bool and dict
+
+            The first value (bool) indicates whether all the templates match the
+            manifest. The second value (dict) maps service names to an error message.
+        """
+        errors = {}
 
-                with open(filename, "w") as fp:
-                    fp.write(template)
+        for s in self.get_services(service_names):
+            error = manifest.verify(s, self.get_template_file(s))
+            if error:
+                errors[s["name"]] = error
 
-                logger.info("Template written to %s" % filename)
+        return not errors, errors
 
     def update(self, cmd_type, service_name, value, output_file=None, verify_ssl=True):
         """ Update service object and write it to file """
@@ -312,55 +456,94 @@ class SaasHerder(object):
 
         self.write_service_file(service_name, output_file)
 
+    def get_image_tag(self, s):
+        """ Returns the image tag derived from the service hash, None if no
+            IMAGE_TAG should be generated """
+
+        if s["hash"] == "master":
+            return "latest"
+        elif s["hash"] == "ignore":
+            return None
+
+        hash_len = s.get("hash_length", self._default_hash_length)
+        return s["hash"][:hash_len]
+
+    def get_template_parameters(self, s):
+        """ Returns the list of parameters ({"name": ..., "value": ...}) used to
+            process the template of a service """
+
+        tag = self.get_image_tag(s)
+        service_params = s.get("parameters", {})
+
+        if tag and 'IMAGE_TAG' not in service_params:
+            parameters = [{"name": "IMAGE_TAG", "value": tag}]
+        else:
+            parameters = []
+
+        for key, val in service_params.iteritems():
+            # due to the usage of anymarkup
+            # we still want to pass strings in this case
+            if val is True:
+                val = 'true'
+            elif val is False:
+                val = 'false'
+
+            if any([isinstance(val, t) for t in [dict, list, tuple]]):
+                val = json.dumps(val)
+
+            parameters.append({"name": key, "value": val})
+
+        return parameters
+
     def process_image_tag(self, services, output_dir,
                           template_filter=None,
                           force=False,
                           local=False,
-                          ignore_unknown_parameters=False):
-        """ iterates through the services and runs oc process to generate the templates """
+                          ignore_unknown_parameters=False,
+                          jobs=1,
+                          engine="oc",
+                          label=False,
+                          saas_repo_url=None,
+                          current=False,
+                          stream=False):
+        """ iterates through the services and runs oc process to generate the templates
+
+            jobs: number of templates processed concurrently. Failures are
+            collected and raised as one ProcessingError once all the
+            services are processed.
+            engine: "oc" to run oc process, "native" to process the templates in
+            process with TemplateProcessor (always local)
+            label: add saasherder labels to the processed templates. The
+            processed template is kept in memory from processing through
+            filtering and labeling. The data-sha256sum label is computed from
+            the text the template would be written as without label, so the
+            result is the same as template followed by the label command.
+            stream: filter the output of oc process while it is read, one
+            object at a time (see stream_objects), instead of loading it
+            whole. Only used with the oc engine and without label, which
+            needs the whole template for its data-sha256sum.
+
+            Returns the list of label selectors (in service order) if label is set.
+        """
 
-        if not find_executable("oc"):
+        if engine == "native":
+            processor = TemplateProcessor(ignore_unknown_parameters)
+        elif not find_executable("oc"):
             raise Exception("Aborting: Could not find oc binary")
 
+        to_process = []
         for s in self.get_services(services):
             if s.get("skip") and not force:
                 logger.warning("INFO: Skipping %s, use -f to force processing of all templates" % s.get("name"))
                 continue
 
-            output = ""
-            template_file = self.get_template_file(s)
-
             # Verify the 'hash' key
             if not s["hash"]:
                 logger.warning("Skipping %s (it doesn't contain the 'hash' key)" % s["name"])
                 continue
-            elif s["hash"] == "master":
-                tag = "latest"
-            elif s["hash"] == "ignore":
-                tag = None
-            else:
-                hash_len = s.get("hash_length", self._default_hash_length)
-                tag = s["hash"][:hash_len]
 
-            service_params = s.get("parameters", {})
-
-            if tag and 'IMAGE_TAG' not in service_params:
-                parameters = [{"name": "IMAGE_TAG", "value": tag}]
-            else:
-                parameters = []
-
-            for key, val in service_params.iteritems():
-                # due to the usage of anymarkup
-                # we still want to pass strings in this case
-                if val is True:
-                    val = 'true'
-                elif val is False:
-                    val = 'false'
-
-                if any([isinstance(val, t) for t in [dict, list, tuple]]):
-                    val = json.dumps(val)
-
-                parameters.append({"name": key, "value": val})
+            template_file = self.get_template_file(s)
+            parameters = self.get_template_parameters(s)
 
             params_processed = ["%s=%s" % (i["name"], i["value"]) for i in parameters]
             local_opt = "--local" if local else ""
@@ -378,112 +561,229 @@ class SaasHerder(object):
 
             output_file = os.path.join(output_dir, "%s.yaml" % s["name"])
 
+            to_process.append((s, process_cmd, output_file))
+
+        def process_native(s, output_file):
+            logger.info("native process %s > %s" % (self.get_template_file(s), output_file))
+
+            return processor.process_file(self.get_template_file(s),
+                                          self.get_template_parameters(s))
+
+        def process_stream(s, process_cmd, output_file):
             logger.info("%s > %s" % (" ".join(process_cmd), output_file))
 
+            p = subprocess.Popen(process_cmd, stdout=subprocess.PIPE)
             try:
-                output = subprocess.check_output(process_cmd)
+                with open_atomic(output_file) as fp:
+                    if template_filter:
+                        self.stream_objects(p.stdout, fp, template_filter)
+                    else:
+                        copyfileobj(p.stdout, fp)
+
+                    if p.wait() != 0:
+                        raise subprocess.CalledProcessError(p.returncode, process_cmd)
+            except Exception as e:
+                return s, e, None
+            finally:
+                p.stdout.close()
+                p.wait()
 
+            return s, None, None
+
+        def process_service(item):
+            s, process_cmd, output_file = item
+            label_selector = None
+
+            if stream and engine != "native" and not label:
+                return process_stream(s, process_cmd, output_file)
+
+            if engine == "native":
+                try:
+                    data_obj = process_native(s, output_file)
+                except TemplateProcessingError as e:
+                    return s, e, None
+            else:
+                logger.info("%s > %s" % (" ".join(process_cmd), output_file))
+
+                try:
+                    output = subprocess.check_output(process_cmd)
+                except subprocess.CalledProcessError as e:
+                    return s, e, None
+
+                if not template_filter and not label:
+                    data_obj = None
+                else:
+                    data_obj = yamlio.load(output)
+
+            if data_obj is not None:
                 if template_filter:
-                    output = self.apply_filter(template_filter, output)
+                    data_obj = self.filter_objects(template_filter, data_obj)
+
+                # the output of oc process is written as is when not filtered
+                if template_filter or engine == "native":
+                    output = yamlio.dump(data_obj)
+
+                if label and not s.get("skip"):
+                    # hash what the label command would read
+                    digest = self.sha256sum_short(output)
+                    saasherder_labels, saasherder_pod_labels, label_selector = \
+                        self.get_saasherder_label_set(s, saas_repo_url, digest, current=current)
+                    self.add_saasherder_labels(data_obj, saasherder_labels, saasherder_pod_labels)
+
+                    # labeled templates are written like the label command does
+                    output = yamlio.dump(data_obj, block_strings=True)
+
+            with open(output_file, "w") as fp:
+                fp.write(output)
+
+            return s, None, label_selector
+
+        def process(item):
+            # any failure of a service is collected, the others go on
+            try:
+                return process_service(item)
+            except Exception as e:
+                logger.debug("Processing %s failed" % item[0]["name"], exc_info=True)
+                return item[0], e, None
+
+        if jobs > 1 and len(to_process) > 1:
+            pool = ThreadPool(min(jobs, len(to_process)))
+            try:
+                results = pool.map(process, to_process)
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            results = [process(item) for item in to_process]
+
+        label_selectors = [label_selector for _, _, label_selector in results if label_selector]
 
-                with open(output_file, "w") as fp:
-                    fp.write(output)
+        failed = [(s["name"], error) for s, error, _ in results if error]
+        for name, error in failed:
+            logger.error("Processing %s failed: %s" % (name, error))
 
-            except subprocess.CalledProcessError as e:
-                print e.message
-                sys.exit(1)
+        if failed:
+            raise ProcessingError(failed, label_selectors)
+
+        return label_selectors
 
     def template(self, cmd_type, services,
                  output_dir=None,
                  template_filter=None,
                  force=False,
                  local=False,
-                 ignore_unknown_parameters=False):
-        """ Process templates """
+                 ignore_unknown_parameters=False,
+                 jobs=1,
+                 engine="oc",
+                 label=False,
+                 saas_repo_url=None,
+                 current=False,
+                 print_selectors=True,
+                 stream=False):
+        """ Process templates
+
+            With label set, the processed templates are labeled too (see
+            process_image_tag) and the label selectors are printed (unless
+            print_selectors is False) and returned.
+
+            Raises ProcessingError if any service could not be processed.
+        """
         if not output_dir:
             output_dir = self.output_dir
 
         if not os.path.isdir(output_dir):
             os.mkdir(output_dir) #FIXME
 
+        label_selectors = []
         if cmd_type == "tag":
-            self.process_image_tag(
+            label_selectors = self.process_image_tag(
                 services, output_dir,
                 template_filter,
                 force,
                 local,
-                ignore_unknown_parameters)
+                ignore_unknown_parameters,
+                jobs=jobs,
+                engine=engine,
+                label=label,
+                saas_repo_url=saas_repo_url,
+                current=current,
+                stream=stream)
+
+        if print_selectors:
+            for label_selector in label_selectors:
+                print(label_selector)
+
+        return label_selectors
+
+    def add_object_labels(self, obj, saasherder_labels, saasherder_pod_labels):
+        """ Adds saasherder labels to one object and its pod templates (in place) """
+        return labels.add_object_labels(obj, saasherder_labels, saasherder_pod_labels)
+
+    def add_saasherder_labels(self, data_obj, saasherder_labels, saasherder_pod_labels):
+        """ Adds saasherder labels to all the objects of a processed template (in place) """
+        return labels.add_labels(data_obj, saasherder_labels, saasherder_pod_labels)
 
     def apply_saasherder_labels(self, data, service, saas_repo_url):
-        data_obj = yaml.safe_load(data)
+        data_obj = yamlio.load(data)
 
-        saasherder_labels = \
-            self.get_saasherder_labels(data, service, saas_repo_url)
+        saasherder_labels, saasherder_pod_labels, _ = \
+            self.get_saasherder_label_set(service, saas_repo_url, self.sha256sum_short(data))
 
-        for obj in data_obj.get("items", []):
-            # add labels for label selector filtering
-            labels = obj['metadata'].setdefault('labels', {})
-            for k, v in saasherder_labels.items():
-                labels[k] = v
+        self.add_saasherder_labels(data_obj, saasherder_labels, saasherder_pod_labels)
 
-            # apply pod labels where applicable
-            template = None
-            try:
-                # Deployment, DeploymentConfig, Job, DaemonSet
-                # StatefulSet, ReplicaSet, ReplicationController
-                template = obj['spec']['template']
-            except KeyError:
-                pass
-            try:
-                # CronJob
-                template = obj['spec']['jobTemplate']['spec']['template']
-            except KeyError:
-                pass
-            if template:
-                pod_labels = template.setdefault('metadata', {}).setdefault('labels', {})
-                saasherder_pod_labels = \
-                    self.get_saasherder_labels(data, service, saas_repo_url,
-                                                pod_labels=True)
-                for k, v in saasherder_pod_labels.items():
-                    pod_labels[k] = v
-
-        return yaml.safe_dump(data_obj, encoding='utf-8',
-                              default_flow_style=False)
+        return yamlio.dump(data_obj, block_strings=True)
+
+    def stream_saasherder_labels(self, input_path, output_path, service, saas_repo_url,
+                                 current=False):
+        """ Streaming version of apply_saasherder_labels for files (see
+            labels.label_file). Returns the label selector. """
+        return labels.label_file(input_path, output_path, self.config.current(), service["name"],
+                                 saas_repo_url, current=current, stream=True)
 
     @staticmethod
     def sha256sum_short(data):
-        return hashlib.sha256(data).hexdigest()[:10]
-
-    def get_saasherder_labels(self, data, service, saas_repo_url,
-                              pod_labels=False):
-        labels = {}
-        labels['saasherder.context'] = self.config.current()
-        labels['saasherder.service'] = service['name']
-        if pod_labels:
-            return labels
+        return labels.sha256sum_short(data)
 
-        labels['saasherder.data-sha256sum'] = self.sha256sum_short(data)
-        if saas_repo_url:
-            labels['saasherder.saas-repo-url-sha256sum'] = \
-                self.sha256sum_short(saas_repo_url)
+    @staticmethod
+    def sha256sum_short_file(path):
+        """ sha256sum_short of the content of a file, read in chunks """
+        return labels.sha256sum_short_file(path)
 
-        return labels
+    def get_saasherder_labels(self, data, service, saas_repo_url,
+                              pod_labels=False, digest=None):
+        """ digest: the data-sha256sum if it is already known, data is not
+            hashed then """
+        if not pod_labels and not digest:
+            digest = self.sha256sum_short(data)
+
+        return labels.saasherder_labels(self.config.current(), service['name'], digest,
+                                        saas_repo_url, pod_labels=pod_labels)
+
+    def get_saasherder_label_set(self, service, saas_repo_url, digest, current=True):
+        """ Returns the labels, the pod labels and the label selector of a
+            service whose processed template has the data-sha256sum digest
+            (see labels.label_set) """
+        return labels.label_set(self.config.current(), service['name'], digest,
+                                saas_repo_url, current=current)
 
     def get_saasherder_label_selector(self, data, service, saas_repo_url,
-                                      current=True):
-        labels = self.get_saasherder_labels(data, service, saas_repo_url)
-        label_selector = ''
-        for k, v in labels.items():
-            comma = "," if label_selector else ""
-            label_selector = "%s%s%s==%s" % (label_selector, comma, k, v)
-        if not current:
-            label_selector = label_selector.replace('data-sha256sum==', 'data-sha256sum!=')
+                                      current=True, digest=None):
+        saasherder_labels = self.get_saasherder_labels(data, service, saas_repo_url, digest=digest)
 
-        return label_selector
+        return labels.format_label_selector(saasherder_labels, current)
 
     def label(self, services, input_dir=None, output_dir=None, saas_repo_url=None,
-              current=False):
-        """ Add labels to processed file """
+              current=False, print_selectors=True, stream=False, jobs=1):
+        """ Add labels to processed file. Returns the label selectors, which are
+            also printed unless print_selectors is False
+
+            stream: label the files one object at a time (see
+            labels.label_file) instead of loading them whole. The output and
+            the label selectors are the same.
+            jobs: number of files labeled concurrently, in worker processes as
+            labeling is CPU bound (see workers.process_map). The label
+            selectors are returned and printed in service order either way.
+        """
         if not output_dir:
             output_dir = self.output_dir
 
@@ -493,23 +793,32 @@ class SaasHerder(object):
         if not os.path.isdir(output_dir):
             os.mkdir(output_dir) #FIXME
 
-        label_selectors = []
+        tasks = []
         for s in self.get_services(services):
             if s.get("skip"):
                 logger.warning("INFO: Skipping labeling of %s" % s.get("name"))
                 continue
 
             file_name = "%s.yaml" % s["name"]
-            input_file_path = os.path.join(input_dir, file_name)
-            with open(input_file_path, "r") as input_file:
-                data = input_file.read()
-            output = self.apply_saasherder_labels(data, s, saas_repo_url)
-            output_file_path = os.path.join(output_dir, file_name)
-            with open(output_file_path, "w") as output_file:
-                output_file.write(output)
-            label_selector = self.get_saasherder_label_selector(data, s, saas_repo_url, current=current)
+            tasks.append((os.path.join(input_dir, file_name),
+                          os.path.join(output_dir, file_name),
+                          self.config.current(), s["name"], saas_repo_url, current, stream))
+
+        if jobs > 1 and len(tasks) > 1:
+            label_selectors = workers.process_map(labels.label_file_task, tasks, jobs)
+
+            if print_selectors:
+                for label_selector in label_selectors:
+                    print(label_selector)
+
+            return label_selectors
+
+        label_selectors = []
+        for task in tasks:
+            label_selector = labels.label_file_task(task)
             label_selectors.append(label_selector)
-            print(label_selector)
+            if print_selectors:
+                print(label_selector)
 
         return label_selectors
 
@@ -533,18 +842,30 @@ class SaasHerder(object):
 
         return result
 
+    def get_fields(self, fields, services):
+        """ Get several fields of services at once. Returns a list with one
+            dictionary (field -> value) per service """
+        columns = [self.get(field, services) for field in fields]
+
+        return [dict(zip(fields, values)) for values in zip(*columns)]
+
     def print_objects(self, objects):
         for s in self.services.get("services", []):
             template_file = self.get_template_file(s)
-            template = anymarkup.parse_file(template_file)
+            template = yamlio.parse_file(template_file)
             print(s.get("name"))
             for o in template.get("objects", []):
                 if o.get("kind") in objects:
                     print("=> %s: %s" % (o.get("kind"), o.get("metadata", {}).get("name")))
 
-    def validate(self):
+    def validate(self, jobs=1, cache=None):
         """ Apply all validation rules on all the templates that must be already available
 
+            jobs: number of templates validated concurrently (see
+            validation.ValidationEngine)
+            cache: optional ValidationCache with the results of templates
+            validated before
+
             Returns two values: bool and list
 
             The first value (bool) indicates whether the validation is
@@ -553,22 +874,22 @@ class SaasHerder(object):
 
         """
 
-        valid = True
-        errors_service = {}
-
+        template_files = {}
         for service_name, service in self.services.items():
             if service.get('hash'):
-                template_file = self.get_template_file(service)
-                template = anymarkup.parse_file(template_file)
+                template_files[service_name] = self.get_template_file(service)
 
-                for rule_class in VALIDATION_RULES:
-                    rule = rule_class(template)
-                    errors = rule.validate()
+        results = ValidationEngine(jobs, cache).validate(template_files.values())
+
+        valid = True
+        errors_service = {}
+        for service_name, template_file in template_files.items():
+            errors = results[template_file]
 
-                    if errors:
-                        valid = False
-                        errors_service.setdefault(
-                            service_name, []).extend(errors)
+            if errors:
+                valid = False
+                errors_service.setdefault(
+                    service_name, []).extend(errors)
 
         return valid, errors_service
 
@@ -0,0 +1,78 @@
+import threading
+import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+import logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 60
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF_FACTOR = 0.5
+
+# Responses worth another attempt: rate limiting and transient server errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class SessionPool(object):
+    """ Hands out one keep-alive requests.Session per host, so that consecutive
+        downloads from the same host reuse TCP/TLS connections. Failed requests
+        are retried with exponential backoff on connection errors and on
+        RETRY_STATUSES.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT,
+                 retries=DEFAULT_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def new_session(self):
+        """ Returns a session with a connection pool and the retry policy mounted """
+        retry = Retry(total=self.retries,
+                      backoff_factor=self.backoff_factor,
+                      status_forcelist=RETRY_STATUSES,
+                      respect_retry_after_header=True,
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=self.pool_size,
+                              max_retries=retry)
+
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        return session
+
+    def session(self, url):
+        """ Returns the session shared by all requests to the host of url """
+        parsed = urlparse.urlparse(url)
+        key = (parsed.scheme, parsed.netloc)
+
+        with self._lock:
+            if key not in self._sessions:
+                logger.debug("Opening HTTP session for %s://%s" % key)
+                self._sessions[key] = self.new_session()
+
+            return self._sessions[key]
+
+    def get(self, url, **kwargs):
+        """ requests.get through the pooled session of the url's host """
+        kwargs.setdefault("timeout", self.timeout)
+
+        return self.session(url).get(url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+
+            self._sessions = {}
@@ -1,11 +1,35 @@
+"""
+Validation rules for the templates of the services
+
+ValidationEngine parses every template once, indexes its objects by kind once
+for all the rules and validates templates in worker processes (see
+workers.process_map). Results are cached by template digest and
+RULESET_VERSION, bump it whenever a rule is added or changed.
+"""
+
+import os
+
+import images
+import workers
+import yamlio
+from manifest import sha256sum_file
+
+import logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# version of VALIDATION_RULES, part of the key of cached results
+RULESET_VERSION = 1
+
+
 class ValidationRule(object):
-    def __init__(self, template):
+    def __init__(self, template, objects=None):
+        """ objects: index of the objects of template by kind, built if not
+            given. Shared by all the rules validating a template. """
         self.template = template
-
-        self.objects = {}
-        for obj in template['objects']:
-            kind = obj['kind']
-            self.objects.setdefault(kind, []).append(obj)
+        if objects is None:
+            objects = images.objects_by_kind(template['objects'])
+        self.objects = objects
 
     def error(self, msg):
         return "{}: {}".format(self.__class__.__name__, msg)
@@ -17,8 +41,8 @@ class ContainerRequestsLimitsRule(ValidationRule):
 
     def validate(self):
         errors = []
-        for dc in self.objects['DeploymentConfig']:
-            for container in dc['spec']['template']['spec']['containers']:
+        for dc in self.objects.get('DeploymentConfig', []):
+            for container in images.containers(dc, init=False):
                 resources = container.get('resources', {})
 
                 limits = resources.get('limits', {})
@@ -48,3 +72,82 @@ class ContainerRequestsLimitsRule(ValidationRule):
         return errors
 
 VALIDATION_RULES = [ContainerRequestsLimitsRule]
+
+
+def validate_template(template, rules=None):
+    """ Returns the errors of all the rules for a parsed template """
+    objects = images.objects_by_kind(template['objects'])
+
+    errors = []
+    for rule_class in rules or VALIDATION_RULES:
+        errors.extend(rule_class(template, objects).validate())
+
+    return errors
+
+
+def validate_file(path):
+    """ Parses and validates a template, module level so that it can run in a
+        worker process """
+    return validate_template(yamlio.parse_file(path))
+
+
+def validate_file_task(path):
+    """ validate_file for process_map. Returns (errors, None), or (None,
+        error message) if the template could not be read or parsed, so that
+        one broken template does not abort the validation of the others """
+    try:
+        return validate_file(path), None
+    except Exception as e:
+        return None, "Could not validate %s: %s" % (path, e)
+
+
+class ValidationEngine(object):
+    """ Validates templates with VALIDATION_RULES
+
+        jobs: number of templates validated concurrently, in worker processes
+        cache: optional ValidationCache, templates validated before with the
+        same RULESET_VERSION are not validated again
+    """
+
+    def __init__(self, jobs=1, cache=None):
+        self.jobs = jobs
+        self.cache = cache
+
+    @staticmethod
+    def key(digest):
+        return "%s:%s" % (RULESET_VERSION, digest)
+
+    def validate(self, paths):
+        """ Returns a dictionary path -> list of errors """
+        results = {}
+
+        to_validate = []
+        for path in sorted(set(paths)):
+            key = None
+            if self.cache and os.path.isfile(path):
+                key = self.key(sha256sum_file(path))
+                errors = self.cache.get(key)
+                if errors is not None:
+                    results[path] = errors
+                    continue
+
+            to_validate.append((path, key))
+
+        validated = workers.process_map(validate_file_task,
+                                        [path for path, _ in to_validate], self.jobs)
+
+        for (path, key), (errors, failure) in zip(to_validate, validated):
+            if failure:
+                # reported as an error of the template, and not cached
+                logger.error(failure)
+                results[path] = [failure]
+                continue
+
+            results[path] = errors
+            if key:
+                self.cache.put(key, errors)
+
+        if self.cache:
+            self.cache.save()
+
+        return results
@@ -0,0 +1,34 @@
+"""
+Runs CPU bound work (labeling, validation) in worker processes
+
+Worker processes are forked, and on Python 2 forking while another thread
+holds a lock (logging, the import lock, the queues of a ThreadPool) can leave
+the child deadlocked. Processes are therefore only used from the main thread;
+commands running in several contexts at once (see ContextRunner) are already
+on threads, and map their work on threads instead.
+"""
+
+import threading
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+
+
+def is_main_thread():
+    return isinstance(threading.current_thread(), threading._MainThread)
+
+
+def process_map(func, items, jobs=1):
+    """ Returns [func(item) for item in items], computed by up to jobs worker
+        processes (threads off the main thread). func must be a module level
+        function. """
+    items = list(items)
+    if jobs <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    pool_class = Pool if is_main_thread() else ThreadPool
+    pool = pool_class(min(jobs, len(items)))
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.terminate()
+        pool.join()
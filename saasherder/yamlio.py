@@ -0,0 +1,211 @@
+"""
+YAML input and output used by all of saasherder
+
+Uses the libyaml based CSafeLoader/CSafeDumper when PyYAML was built with
+libyaml, and the pure Python SafeLoader/SafeDumper otherwise. Both produce
+the same documents, the C versions are several times faster on big templates.
+
+iter_list and ListWriter read and write List documents (processed templates)
+one item at a time, so memory is bounded by the largest object instead of the
+largest file.
+"""
+
+import os
+
+import anymarkup
+import yaml
+from yaml.events import MappingEndEvent, MappingStartEvent, SequenceEndEvent, SequenceStartEvent
+
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+# the libyaml loader cannot compose a single node, streaming uses the pure
+# Python one
+from yaml import SafeLoader as StreamLoader
+
+YAML_EXTENSIONS = ("yaml", "yml")
+
+
+def represent_block_str(dumper, data):
+    """ Multi-line strings as literal blocks, like anymarkup does """
+    if len(data.splitlines()) > 1:
+        return dumper.represent_scalar(u'tag:yaml.org,2002:str', data, style='|')
+    return dumper.represent_scalar(u'tag:yaml.org,2002:str', data)
+
+
+class BlockStringDumper(SafeDumper):
+    pass
+
+BlockStringDumper.add_representer(str, represent_block_str)
+BlockStringDumper.add_representer(unicode, represent_block_str)
+
+
+def load(stream):
+    """ Parses a YAML document from a string or a file object """
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def dump(data, stream=None, block_strings=False):
+    """ Serializes data as a block style YAML document (utf-8 encoded). Returns
+        it as a string unless a stream is given.
+
+        block_strings: write multi-line strings as literal blocks. This is what
+        anymarkup (and yaml.safe_dump once anymarkup is imported) produces, while
+        processed templates have always been written with quoted strings.
+    """
+    dumper = BlockStringDumper if block_strings else SafeDumper
+
+    return yaml.dump(data, stream, Dumper=dumper, encoding='utf-8',
+                     default_flow_style=False)
+
+
+def is_yaml(path):
+    return os.path.splitext(path)[1][len(os.path.extsep):] in YAML_EXTENSIONS
+
+
+def _force_types(struct):
+    """ Mirrors anymarkup's force_types=True: strings are unicode, and strings
+        that look like numbers, booleans or null are converted to them """
+    if isinstance(struct, dict):
+        return dict((_force_types(k), _force_types(v)) for k, v in struct.items())
+    elif isinstance(struct, list):
+        return [_force_types(i) for i in struct]
+    elif isinstance(struct, str):
+        struct = struct.decode('utf-8')
+
+    if not isinstance(struct, unicode):
+        return struct
+
+    for tp in (int, long, float):
+        try:
+            return tp(struct)
+        except ValueError:
+            pass
+
+    if struct.lower() == 'true':
+        return True
+    if struct.lower() == 'false':
+        return False
+    if struct.lower() in ['none', 'null']:
+        return None
+
+    return struct
+
+
+def parse_file(path, force_types=True):
+    """ Drop-in replacement for anymarkup.parse_file. YAML files are parsed with
+        the fastest available loader, other formats are left to anymarkup. """
+    if not is_yaml(path) or force_types is False:
+        return anymarkup.parse_file(path, force_types=force_types)
+
+    with open(path) as fp:
+        return parse(fp, force_types=force_types)
+
+
+def parse(data, path=None, force_types=True):
+    """ Like parse_file for content that is already read (string or file
+        object). path, if given, is only used to tell the format """
+    if (path and not is_yaml(path)) or force_types is False:
+        return anymarkup.parse(data, force_types=force_types)
+
+    data = load(data)
+
+    if force_types:
+        data = _force_types(data)
+
+    return data
+
+
+def serialize_file(data, path):
+    """ Drop-in replacement for anymarkup.serialize_file """
+    if not is_yaml(path):
+        return anymarkup.serialize_file(data, path)
+
+    with open(path, "w") as fp:
+        dump(data, fp, block_strings=True)
+
+
+ITEM = "item"
+FIELD = "field"
+
+LIST_ITEMS = "items"
+
+
+def iter_list(stream):
+    """ Parses a List document (a mapping with an items list) from a file
+        object one object at a time. Yields (ITEM, object) for every item and
+        (FIELD, (key, value)) for the other keys of the mapping, in document
+        order. """
+    loader = StreamLoader(stream)
+    try:
+        # stream and document start
+        loader.get_event()
+        loader.get_event()
+
+        if not loader.check_event(MappingStartEvent):
+            raise Exception("Expected a List document in %s" % getattr(stream, "name", "stream"))
+        loader.get_event()
+
+        while not loader.check_event(MappingEndEvent):
+            key = loader.construct_document(loader.compose_node(None, None))
+
+            if key == LIST_ITEMS and loader.check_event(SequenceStartEvent):
+                loader.get_event()
+                while not loader.check_event(SequenceEndEvent):
+                    yield ITEM, loader.construct_document(loader.compose_node(None, None))
+                loader.get_event()
+            else:
+                yield FIELD, (key, loader.construct_document(loader.compose_node(None, None)))
+    finally:
+        loader.dispose()
+
+
+class ListWriter(object):
+    """ Writes a List document to a file object one item at a time. The
+        output is the same as dump() of the whole document, as long as the
+        keys sorted before "items" are written before the first item.
+
+        with ListWriter(fp) as writer:
+            writer.write_field("apiVersion", "v1")
+            writer.write_item(obj)
+    """
+
+    def __init__(self, fp, block_strings=False):
+        self.fp = fp
+        self.block_strings = block_strings
+        self.fields = {}
+        self.items = 0
+        self._items_started = False
+
+    def _write_fields(self, keys):
+        for key in sorted(keys):
+            dump({key: self.fields.pop(key)}, self.fp, block_strings=self.block_strings)
+
+    def write_field(self, key, value):
+        """ Fields are buffered and written in sorted order around the items """
+        self.fields[key] = value
+
+    def write_item(self, obj):
+        if not self._items_started:
+            self._write_fields([k for k in self.fields if k < LIST_ITEMS])
+            self.fp.write("%s:\n" % LIST_ITEMS)
+            self._items_started = True
+
+        # a block sequence in a mapping is not indented, so each item is
+        # written exactly like it is within the whole document
+        dump([obj], self.fp, block_strings=self.block_strings)
+        self.items += 1
+
+    def close(self):
+        if not self._items_started:
+            self.fields[LIST_ITEMS] = []
+        self._write_fields(list(self.fields))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
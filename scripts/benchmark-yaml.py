@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""
+Compares the pure Python and the libyaml based PyYAML loader/dumper on a large
+generated processed template (a List of DeploymentConfigs, Services and
+ConfigMaps, similar to what `saasherder template` produces).
+
+Usage: benchmark-yaml.py [number-of-services]
+"""
+
+import sys
+import timeit
+
+import yaml
+
+sys.path.insert(0, "saasherder")
+import yamlio
+
+
+def generate_template(services):
+    items = []
+    for i in range(services):
+        name = "service-%s" % i
+        items.append({
+            "apiVersion": "v1",
+            "kind": "DeploymentConfig",
+            "metadata": {"name": name, "labels": {"app": name}},
+            "spec": {
+                "replicas": 2,
+                "selector": {"app": name},
+                "template": {
+                    "metadata": {"labels": {"app": name}},
+                    "spec": {"containers": [{
+                        "name": name,
+                        "image": "quay.io/openshiftio/%s:abcdef" % name,
+                        "env": [{"name": "VAR_%s" % j, "value": "value %s" % j} for j in range(20)],
+                        "resources": {"limits": {"cpu": "1", "memory": "1Gi"},
+                                      "requests": {"cpu": "100m", "memory": "256Mi"}},
+                    }]},
+                },
+            },
+        })
+        items.append({
+            "apiVersion": "v1",
+            "kind": "Service",
+            "metadata": {"name": name},
+            "spec": {"ports": [{"name": "8080", "port": 8080, "targetPort": 8080}],
+                     "selector": {"app": name}},
+        })
+        items.append({
+            "apiVersion": "v1",
+            "kind": "ConfigMap",
+            "metadata": {"name": name},
+            "data": dict(("key-%s" % j, "some configuration value %s\n" % j * 5) for j in range(20)),
+        })
+
+    return {"apiVersion": "v1", "kind": "List", "metadata": {}, "items": items}
+
+
+class PureSafeDumper(yaml.SafeDumper):
+    """ yaml.SafeDumper without the representers anymarkup registers on import """
+    pass
+
+PureSafeDumper.add_representer(str, yaml.representer.SafeRepresenter.represent_str)
+PureSafeDumper.add_representer(unicode, yaml.representer.SafeRepresenter.represent_unicode)
+
+
+def bench(name, func, repeat=3):
+    best = min(timeit.repeat(func, number=1, repeat=repeat))
+    print "%-28s %8.3fs" % (name, best)
+    return best
+
+
+def main():
+    services = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    data = yaml.dump(generate_template(services), Dumper=PureSafeDumper, encoding='utf-8',
+                     default_flow_style=False)
+    obj = yaml.safe_load(data)
+    print "template: %s services, %.1f MB" % (services, len(data) / 1024.0 / 1024.0)
+
+    if yamlio.SafeLoader is yaml.SafeLoader:
+        print "PyYAML is built without libyaml, nothing to compare"
+        sys.exit(1)
+
+    load_py = bench("load (SafeLoader)", lambda: yaml.load(data, Loader=yaml.SafeLoader))
+    load_c = bench("load (yamlio)", lambda: yamlio.load(data))
+    dump_py = bench("dump (SafeDumper)", lambda: yaml.dump(obj, Dumper=PureSafeDumper, encoding='utf-8',
+                                                          default_flow_style=False))
+    dump_c = bench("dump (yamlio)", lambda: yamlio.dump(obj))
+
+    assert yamlio.dump(obj) == data
+
+    print "load speedup: %.1fx, dump speedup: %.1fx" % (load_py / load_c, dump_py / dump_c)
+
+
+if __name__ == "__main__":
+    main()
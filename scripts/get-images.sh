@@ -8,7 +8,7 @@
 # WARNING: It will remove this file if it exists.
 #
 # If the variable NO_REFRESH is defined and contains a value, the repos will not
-# be git pull'ed and the templates will not be generated. This will speed things
+# be git pull'ed and the templates will not be pulled. This will speed things
 # up, but it is required to run it normally, i.e. without this flag, before
 # running it with this flag.
 #
@@ -29,8 +29,6 @@
 #
 # - already cloned saas repos
 # - saasherder
-# - oc client
-# - yq and jq
 
 set -e
 
@@ -41,28 +39,18 @@ rm -f $OUT
 for saasrepo in "$@"; do
     pushd "${saasrepo}"
 
-    [ -z "$NO_REFRESH" ] && git pull
+    if [ -z "$NO_REFRESH" ]; then
+        git pull
 
-    for context in `saasherder config get-contexts`; do
-        [ -z "$context" ] && echo "Empty context" && exit 1
-
-        if [ -z "$NO_REFRESH" ]; then
-            rm -rf "${context}-out"
-            saasherder --context "${context}" pull
-            saasherder --environment production template --local --output-dir "${context}-out" tag
-        fi
-
-        for f in `ls ${context}-out/*`; do
-            service=$(basename "$f" .yaml)
-            git_hash=$(saasherder --context $context get hash $service)
-            git_url=$(saasherder --context $context get url $service)
-            images=$(yq -r '.items | .[] | select(.kind=="DeploymentConfig").spec.template.spec.containers | .[] | .image ' $f)
-
-            for i in $images; do
-                echo "${saasrepo};${context};${service};${git_url};${git_hash};${i}" | tee -a "$OUT"
-            done
+        for context in `saasherder config get-contexts`; do
+            [ -z "$context" ] && echo "Empty context" && exit 1
+            saasherder --context "${context}" pull --jobs 8
         done
-    done
+    fi
+
+    # images of all the services of all contexts, the pulled templates are
+    # processed in process
+    saasherder --environment production images --repo "${saasrepo}" --jobs 8 | tee -a "$OUT"
 
     popd
 done
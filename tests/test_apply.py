@@ -0,0 +1,105 @@
+import os
+import tempfile
+import threading
+import time
+
+from apply import Applier, ApplyError, OcExecutor
+from manifest import DeployState
+
+
+class FakeExecutor(object):
+  """ Cluster stand-in: records the applies and the highest number of
+      concurrent applies per cluster, files in failing are rejected """
+
+  def __init__(self, failing=(), delay=0.01):
+    self.failing = failing
+    self.delay = delay
+    self.calls = []
+    self.running = {}
+    self.max_running = {}
+    self.lock = threading.Lock()
+
+  def apply(self, path, kubeconfig=None, dry_run=False):
+    with self.lock:
+      self.calls.append((path, kubeconfig, dry_run))
+      self.running[kubeconfig] = self.running.get(kubeconfig, 0) + 1
+      self.max_running[kubeconfig] = max(self.max_running.get(kubeconfig, 0), self.running[kubeconfig])
+
+    time.sleep(self.delay)
+
+    with self.lock:
+      self.running[kubeconfig] -= 1
+
+    if path in self.failing:
+      raise ApplyError("error: %s is invalid" % path)
+
+    return "deploymentconfig \"%s\" configured\n" % path
+
+
+class TestApply(object):
+  def test_apply_files(self):
+    executor = FakeExecutor(failing=["b.yaml"])
+    results = Applier(executor, jobs=2).apply_files(["a.yaml", "b.yaml", "c.yaml"], "cfg-saas")
+
+    assert results == [("OK", "a.yaml", "deploymentconfig \"a.yaml\" configured\n"),
+                       ("FAILED", "b.yaml", "error: b.yaml is invalid"),
+                       ("OK", "c.yaml", "deploymentconfig \"c.yaml\" configured\n")]
+    # failures do not stop the other files
+    assert sorted(path for path, _, _ in executor.calls) == ["a.yaml", "b.yaml", "c.yaml"]
+
+  def test_jobs_per_cluster(self):
+    executor = FakeExecutor()
+    applier = Applier(executor, jobs=2)
+    files = ["%s.yaml" % i for i in range(8)]
+
+    # two contexts deploying to the same cluster share its limit
+    threads = [threading.Thread(target=applier.apply_files, args=(files, "cfg-shared")) for _ in range(2)]
+    threads.append(threading.Thread(target=applier.apply_files, args=(files, "cfg-other")))
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+
+    assert len(executor.calls) == 24
+    assert executor.max_running["cfg-shared"] <= 2
+    assert executor.max_running["cfg-other"] <= 2
+
+  def test_dry_run(self):
+    executor = FakeExecutor()
+    Applier(executor, jobs=1, dry_run=True).apply_files(["a.yaml"])
+
+    assert executor.calls == [("a.yaml", None, True)]
+
+  def test_oc_command(self):
+    assert OcExecutor().command("a.yaml", "cfg-saas") == \
+        ["oc", "--config=cfg-saas", "apply", "-f", "a.yaml"]
+    assert OcExecutor("https://api:6443", "t").command("a.yaml", "cfg-saas", dry_run=True) == \
+        ["oc", "--server=https://api:6443", "--token=t", "apply", "--dry-run", "-f", "a.yaml"]
+
+
+class TestDeployState(object):
+  def processed(self, content):
+    path = os.path.join(tempfile.mkdtemp(), "redirector.yaml")
+    with open(path, "w") as fp:
+      fp.write(content)
+    return path
+
+  def test_key(self):
+    assert DeployState.key("saas") == "saas"
+    assert DeployState.key("saas", "production") == "saas/production"
+
+  def test_is_applied(self):
+    state_file = os.path.join(tempfile.mkdtemp(), "deployed.json")
+    processed_file = self.processed("items: []\n")
+
+    state = DeployState(state_file)
+    assert not state.is_applied("saas", processed_file)
+    state.record("saas", processed_file)
+    state.save()
+
+    state = DeployState(state_file)
+    assert state.entries.keys() == ["saas"]
+    assert state.is_applied("saas", processed_file)
+    # same service in another environment, and another content
+    assert not state.is_applied("saas/production", processed_file)
+    assert not state.is_applied("saas", self.processed("items:\n- kind: Route\n"))
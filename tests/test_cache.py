@@ -0,0 +1,75 @@
+import os
+import tempfile
+from shutil import copytree, copyfile
+
+from saasherder import SaasHerder
+from cache import TemplateCache
+
+temp_dir = tempfile.mkdtemp()
+tests_dir = os.path.join(temp_dir, 'tests', 'data')
+temp_path = os.path.join(temp_dir, "config.yaml")
+
+pinned_service = {
+  "name": "redirector",
+  "hash": "aab9fc5fa5c24360079998f2209b2b55c3af29ae",
+  "path": "/openshift/template.yaml",
+  "url": "https://github.com/org/repo/",
+}
+
+branch_service = dict(pinned_service, hash="master")
+
+
+class FakeResponse(object):
+  def __init__(self, status_code, content="", headers=None):
+    self.status_code = status_code
+    self.content = content
+    self.headers = headers or {}
+
+
+class FakeSessionPool(object):
+  def __init__(self, *responses):
+    self.responses = list(responses)
+    self.requests = []
+
+  def get(self, url, headers=None, **kwargs):
+    self.requests.append(headers)
+    return self.responses.pop(0)
+
+
+class TestTemplateCache(object):
+  def setup_method(self, method):
+    copyfile("tests/data/config.yaml", temp_path)
+    if not os.path.isdir(tests_dir):
+      copytree("tests/data", tests_dir)
+    self.cache = TemplateCache(tempfile.mkdtemp())
+
+  def test_is_pinned(self):
+    assert TemplateCache.is_pinned(pinned_service)
+    assert not TemplateCache.is_pinned(branch_service)
+    assert not TemplateCache.is_pinned(dict(pinned_service, hash="abcdef"))
+
+  def test_key(self):
+    assert TemplateCache.key(pinned_service) == \
+        TemplateCache.key(dict(pinned_service, url="https://github.com/org/repo"))
+    assert TemplateCache.key(pinned_service) != TemplateCache.key(branch_service)
+
+  def test_branch_without_etag_not_cached(self):
+    self.cache.put(branch_service, "kind: Template\n")
+    assert self.cache.get(branch_service) == (None, None)
+
+  def test_pinned_served_from_cache(self):
+    sh = SaasHerder(temp_path, None)
+    sh.session_pool = FakeSessionPool(FakeResponse(200, "kind: Template\n"))
+    assert sh.download_template(pinned_service, None, cache=self.cache) == "kind: Template\n"
+    # no responses left, a second download would fail
+    assert sh.download_template(pinned_service, None, cache=self.cache) == "kind: Template\n"
+    assert len(sh.session_pool.requests) == 1
+
+  def test_branch_revalidated(self):
+    sh = SaasHerder(temp_path, None)
+    sh.session_pool = FakeSessionPool(
+      FakeResponse(200, "kind: Template\n", {"ETag": '"v1"'}),
+      FakeResponse(304))
+    assert sh.download_template(branch_service, None, cache=self.cache) == "kind: Template\n"
+    assert sh.download_template(branch_service, None, cache=self.cache) == "kind: Template\n"
+    assert sh.session_pool.requests[1]["If-None-Match"] == '"v1"'
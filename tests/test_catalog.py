@@ -0,0 +1,81 @@
+import os
+import tempfile
+import time
+from shutil import copytree, copyfile
+
+import catalog
+from catalog import ServiceCatalog
+from saasherder import SaasHerder
+
+temp_dir = tempfile.mkdtemp()
+tests_dir = os.path.join(temp_dir, 'tests', 'data')
+temp_path = os.path.join(temp_dir, "config.yaml")
+
+
+class TestServiceCatalog(object):
+  def setup_method(self, method):
+    copyfile("tests/data/config.yaml", temp_path)
+    if not os.path.isdir(tests_dir):
+      copytree("tests/data", tests_dir)
+
+    self.services_dir = tempfile.mkdtemp()
+    for f in os.listdir("tests/data/service"):
+      copyfile(os.path.join("tests/data/service", f), os.path.join(self.services_dir, f))
+      # older than catalog.RACY_SECONDS
+      os.utime(os.path.join(self.services_dir, f), (time.time() - 60, time.time() - 60))
+
+    self.catalog = ServiceCatalog(tempfile.mkdtemp())
+    self.parsed = []
+    parse_file = catalog.yamlio.parse_file
+
+    def counting_parse_file(path, *args, **kwargs):
+      self.parsed.append(os.path.basename(path))
+      return parse_file(path, *args, **kwargs)
+
+    catalog.yamlio.parse_file = counting_parse_file
+    self.parse_file = parse_file
+
+  def teardown_method(self, method):
+    catalog.yamlio.parse_file = self.parse_file
+
+  def test_unchanged_files_not_parsed(self):
+    first = self.catalog.parse_files(self.services_dir)
+    assert len(self.parsed) == len(first)
+
+    del self.parsed[:]
+    assert self.catalog.parse_files(self.services_dir) == first
+    assert self.parsed == []
+
+  def test_changed_file_parsed(self):
+    self.catalog.parse_files(self.services_dir)
+    del self.parsed[:]
+
+    path = os.path.join(self.services_dir, "redirector.yaml")
+    with open(path, "a") as fp:
+      fp.write("\n")
+    os.utime(path, (time.time() - 30, time.time() - 30))
+
+    os.remove(os.path.join(self.services_dir, "hash_length.yaml"))
+
+    files = dict(self.catalog.parse_files(self.services_dir))
+    assert self.parsed == ["redirector.yaml"]
+    assert "hash_length.yaml" not in files
+
+  def test_recently_modified_not_stored(self):
+    os.utime(os.path.join(self.services_dir, "redirector.yaml"), None)
+    self.catalog.parse_files(self.services_dir)
+    del self.parsed[:]
+    self.catalog.parse_files(self.services_dir)
+    assert self.parsed == ["redirector.yaml"]
+
+  def test_saasherder_services(self):
+    sh = SaasHerder(temp_path, None, "production")
+    sh.catalog = self.catalog
+    sh.services_dir = self.services_dir
+    assert sh.services["redirector"]["parameters"]["IMAGE"] == "production_image"
+
+    # environment overrides are not written back to the catalog
+    sh = SaasHerder(temp_path, None)
+    sh.catalog = self.catalog
+    sh.services_dir = self.services_dir
+    assert sh.services["redirector"]["parameters"]["IMAGE"] == "some_image"
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+
+import os
+import subprocess
+import tempfile
+from shutil import copytree, copyfile
+
+from changelog import Changelog, ChangelogRender
+from saasherder import SaasHerder
+
+temp_dir = tempfile.mkdtemp()
+tests_dir = os.path.join(temp_dir, 'tests', 'data')
+temp_path = os.path.join(temp_dir, "config.yaml")
+
+
+def git(repo, *args):
+  return subprocess.check_output(["git", "-C", repo, "-c", "user.name=saasherder",
+                                  "-c", "user.email=saasherder@example.com"] + list(args))
+
+
+def make_repo(path, commits):
+  """ Creates a git repository with the given commit subjects, returns their hashes """
+  os.makedirs(path)
+  git(path, "init", "--quiet")
+  hashes = []
+  for i, subject in enumerate(commits):
+    with open(os.path.join(path, "file"), "w") as fp:
+      fp.write(str(i))
+    git(path, "add", "file")
+    git(path, "commit", "--quiet", "-m", subject)
+    hashes.append(git(path, "rev-parse", "HEAD").strip())
+
+  return hashes
+
+
+class TestChangelog(object):
+  def setup_method(self, method):
+    copyfile("tests/data/config.yaml", temp_path)
+    if not os.path.isdir(tests_dir):
+      copytree("tests/data", tests_dir)
+
+    self.repos = tempfile.mkdtemp()
+    self.changelog = Changelog(SaasHerder(temp_path, None, persist_context=False))
+    self.changelog.workspace = tempfile.mkdtemp()
+
+  def service(self, name, commits):
+    path = os.path.join(self.repos, name)
+    hashes = make_repo(path, commits)
+    return path, dict(name=name, names=[name], url="file://" + path, old=hashes[0], new=hashes[-1])
+
+  def test_collect(self):
+    path, service = self.service("core", ["first", "second", u"third ✓".encode("utf-8")])
+    self.changelog.collect(service)
+
+    assert [c["subject"] for c in service["commits"]] == [u"third ✓", "second"]
+    assert service["last_changed"] == git(path, "log", "-1", "--format=%cd").strip()
+
+  def test_log_like_git(self):
+    path, service = self.service("core", ["first", "second", "third"])
+    self.changelog.collect(service)
+    self.changelog.changed_services = [service]
+
+    render = ChangelogRender(self.changelog, "a" * 40, "b" * 40, "https://example.com/saas")
+    commit_template = '- [%h]({url}/commit/%H) %s'
+    expected = git(path, "log", "--format=" + commit_template.format(url=service["url"]),
+                   "{}...{}".format(service["old"], service["new"]))
+
+    assert render.log(service, commit_template) == expected
+    assert "third" in render.plain()
+
+  def test_markdown_shared_url(self):
+    path, service = self.service("core", ["first", "second"])
+    self.changelog.collect(service)
+    # services deployed from the same repository are one section
+    service["names"] = ["core", "core-worker"]
+    self.changelog.changed_services = [service]
+
+    markdown = ChangelogRender(self.changelog, "a" * 40, "b" * 40, "https://example.com/saas").markdown()
+    assert "**[core, core-worker](%s)**" % service["url"] in markdown
+    assert "second" in markdown
+
+  def test_mirror_shared_and_reused(self):
+    path, service = self.service("core", ["first", "second"])
+    other = dict(service, name="other", names=["other"])
+
+    self.changelog.collect(service)
+    mirror = self.changelog.mirror(service)
+    assert mirror == self.changelog.mirror(other)
+    assert os.path.isfile(os.path.join(mirror, "HEAD"))
+
+    # both commits are in the mirror, nothing is fetched
+    fetch = self.changelog._fetch
+    self.changelog._fetch = None
+    try:
+      self.changelog.collect(other)
+    finally:
+      self.changelog._fetch = fetch
+
+    assert other["commits"] == service["commits"]
+
+  def test_collect_branch(self):
+    path, service = self.service("core", ["first", "second", "third"])
+    service["new"] = git(path, "rev-parse", "--abbrev-ref", "HEAD").strip()
+    self.changelog.collect(service)
+
+    assert [c["subject"] for c in service["commits"]] == ["third", "second"]
+    assert service["last_changed"] == git(path, "log", "-1", "--format=%cd").strip()
+
+  def test_collect_all_jobs(self):
+    now, previous = {}, {}
+    for name in ["b-service", "a-service", "c-service", "d-service"]:
+      _, service = self.service(name, ["first of %s" % name, "last of %s" % name])
+      now[name] = dict(url=service["url"], hash=service["new"])
+      previous[name] = dict(url=service["url"], hash=service["old"])
+
+    self.changelog.fetch_diff(now, previous)
+    self.changelog.collect_all(jobs=3)
+
+    services = self.changelog.changed_services
+    assert [s["name"] for s in services] == ["a-service", "b-service", "c-service", "d-service"]
+    for s in services:
+      assert [c["subject"] for c in s["commits"]] == ["last of %s" % s["name"]]
+
+    render = ChangelogRender(self.changelog, "a" * 40, "b" * 40, "https://example.com/saas")
+    plain = render.plain()
+    assert plain.index("last of a-service") < plain.index("last of b-service") < plain.index("last of d-service")
+
+  def saas_repo(self, services):
+    """ Creates a saas repo with one commit per version of the services,
+        services is a list of {service name: (url, hash)} """
+    path = os.path.join(self.repos, "saas")
+    os.makedirs(os.path.join(path, "services"))
+    git(path, "init", "--quiet")
+    git(path, "remote", "add", "origin", "https://example.com/saas.git")
+
+    with open(os.path.join(path, "config.yaml"), "w") as fp:
+      fp.write("contexts:\n- name: saas\n  data:\n    services_dir: services\n"
+               "    templates_dir: templates\n    output_dir: processed\ncurrent: saas\n")
+
+    commits = []
+    for version in services:
+      for name, (url, service_hash) in version.items():
+        with open(os.path.join(path, "services", "%s.yaml" % name), "w") as fp:
+          fp.write("services:\n- name: %s\n  url: %s\n  hash: %s\n  path: /template.yaml\n" %
+                   (name, url, service_hash))
+      git(path, "add", "-A")
+      git(path, "commit", "--quiet", "-m", "update")
+      commits.append(git(path, "rev-parse", "HEAD").strip())
+
+    return path, commits
+
+  def test_load_services_ref(self):
+    saas, commits = self.saas_repo([{"core": ("file:///core", "a" * 40)},
+                                    {"core": ("file:///core", "b" * 40)}])
+
+    # local changes are neither read nor touched
+    core = os.path.join(saas, "services", "core.yaml")
+    with open(core, "a") as fp:
+      fp.write("  skip: True\n")
+    with open(core) as fp:
+      local = fp.read()
+
+    sh = SaasHerder(os.path.join(saas, "config.yaml"), None, persist_context=False)
+    services, service_files = sh.load_services(commits[0])
+
+    assert services["core"]["hash"] == "a" * 40
+    assert "skip" not in services["core"]
+    assert service_files == {"core.yaml": ["core"]}
+    assert sh.load_services(commits[1])[0]["core"]["hash"] == "b" * 40
+    with open(core) as fp:
+      assert fp.read() == local
+
+  def test_generate(self):
+    _, core = self.service("core", ["first", "second", "third"])
+    saas, commits = self.saas_repo([{"core": (core["url"], core["old"])},
+                                    {"core": (core["url"], core["new"])}])
+    head = git(saas, "rev-parse", "HEAD")
+
+    changelog = Changelog(SaasHerder(os.path.join(saas, "config.yaml"), None, persist_context=False))
+    output = changelog.generate(None, commits[0], commits[1], "plain")
+
+    assert "Context changes: %s..%s" % (commits[0][:8], commits[1]) in output
+    assert "- third\n" in output and "- second\n" in output
+    assert git(saas, "rev-parse", "HEAD") == head
@@ -0,0 +1,83 @@
+import imp
+import importlib
+import os
+import sys
+import tempfile
+from shutil import copytree, copyfile
+
+# cli uses relative imports, so the package is loaded under another name (the
+# saasherder module of PYTHONPATH shadows it)
+imp.load_module("saasherder_package", *imp.find_module("saasherder", [os.getcwd()]))
+cli = importlib.import_module("saasherder_package.cli")
+
+
+class TestCli(object):
+  def setup_method(self, method):
+    # a fresh copy for every test, the commands write to the tests data
+    self.temp_dir = tempfile.mkdtemp()
+    self.tests_dir = os.path.join(self.temp_dir, 'tests', 'data')
+    self.temp_path = os.path.join(self.temp_dir, "config.yaml")
+    copyfile("tests/data/config.yaml", self.temp_path)
+    copytree("tests/data", self.tests_dir)
+
+  def main(self, monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["saasherder", "-c", self.temp_path, "--no-catalog"] + list(args))
+    cli.main()
+
+  def test_pull(self, monkeypatch):
+    pulled = []
+
+    def download_template(se, s, token, **kwargs):
+      pulled.append(s["name"])
+      return "name: %s\n" % s["name"]
+
+    monkeypatch.setattr(cli.SaasHerder, "download_template", download_template)
+    templates_dir = os.path.join(self.tests_dir, "template")
+
+    self.main(monkeypatch, "pull", "--no-cache", "-j", "2")
+    assert sorted(pulled) == ["hash_length", "labeled", "multiple_services", "redirector", "redirector-ignore"]
+    with open(os.path.join(templates_dir, "redirector.yaml")) as fp:
+      assert fp.read() == "name: redirector\n"
+
+    del pulled[:]
+    self.main(monkeypatch, "--contexts", "saas", "pull", "--no-cache", "redirector")
+    assert pulled == ["redirector"]
+
+  def test_changed_only(self, monkeypatch, capsys):
+    applied = []
+
+    class FakeExecutor(object):
+      def __init__(self, server=None, token=None):
+        pass
+
+      def apply(self, path, kubeconfig=None, dry_run=False):
+        applied.append(os.path.basename(path))
+        return "configured\n"
+
+    monkeypatch.setattr(cli, "OcExecutor", FakeExecutor)
+    output_dir = os.path.join(self.temp_dir, "processed")
+    state_file = os.path.join(self.temp_dir, "deployed.json")
+    template = ["template", "--engine", "native", "--output-dir", output_dir,
+                "--changed-only", "--state-file", state_file, "tag"]
+    apply = ["apply", "--input-dir", output_dir, "--state-file", state_file]
+
+    self.main(monkeypatch, *template)
+    files = sorted(os.listdir(output_dir))
+    self.main(monkeypatch, *(apply + ["--changed-only"]))
+    assert sorted(applied) == files
+
+    # unchanged services are reported and their templates kept
+    capsys.readouterr()
+    self.main(monkeypatch, *template)
+    assert "redirector unchanged since it was last applied" in capsys.readouterr()[1]
+    assert sorted(os.listdir(output_dir)) == files
+    labeled_dir = os.path.join(self.temp_dir, "labeled")
+    self.main(monkeypatch, "label", "--input-dir", output_dir, "--output-dir", labeled_dir)
+    assert sorted(os.listdir(labeled_dir)) == files
+
+    del applied[:]
+    self.main(monkeypatch, *(apply + ["--changed-only"]))
+    assert applied == []
+
+    self.main(monkeypatch, *apply)
+    assert sorted(applied) == files
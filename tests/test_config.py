@@ -59,3 +59,23 @@ class TestConfig(object):
     sc = SaasConfig(temp_path, context)
     assert sc.current() == context
 
+
+  def test_switch_context_in_memory(self):
+    with open(temp_path) as fp:
+      config = fp.read()
+
+    sc = SaasConfig(temp_path, "foobar", persist=False)
+    assert sc.current() == "foobar"
+    assert sc.get("templates_dir") == "bar"
+    sc.switch_context("saas")
+    assert sc.current() == "saas"
+
+    with open(temp_path) as fp:
+      assert fp.read() == config
+    assert SaasConfig(temp_path).current() == "saas"
+
+  def test_context_index(self):
+    sc = SaasConfig(temp_path)
+    assert sc.context_exists("foobar")["data"]["templates_dir"] == "bar"
+    sc.add_context("foo", "x", "y", "z")
+    assert sc.context_exists("foo")["data"]["services_dir"] == "x"
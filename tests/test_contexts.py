@@ -0,0 +1,111 @@
+import filecmp
+import os
+import sys
+import tempfile
+import threading
+from shutil import copytree, copyfile
+
+import pytest
+
+from config import SaasConfig
+from contexts import ContextRunner
+import workers
+
+temp_dir = tempfile.mkdtemp()
+tests_dir = os.path.join(temp_dir, 'tests', 'data')
+temp_path = os.path.join(temp_dir, "config.yaml")
+
+
+class TestContextRunner(object):
+  def setup_method(self, method):
+    copyfile("tests/data/config.yaml", temp_path)
+    if not os.path.isdir(tests_dir):
+      copytree("tests/data", tests_dir)
+
+    with open(temp_path) as fp:
+      self.config = fp.read()
+
+  def assert_config_unchanged(self):
+    with open(temp_path) as fp:
+      assert fp.read() == self.config
+
+  def test_for_context(self):
+    sc = SaasConfig(temp_path)
+    foobar = sc.for_context("foobar")
+
+    assert foobar.current() == "foobar"
+    assert foobar.get("templates_dir") == "bar"
+    assert sc.current() == "saas"
+    self.assert_config_unchanged()
+
+  def test_run_all_contexts(self):
+    runner = ContextRunner(temp_path)
+    results = runner.run(lambda context, se: se.config.current())
+
+    assert [context for context, _, _ in results] == ["saas", "foobar"]
+    assert results[0] == ("saas", "saas", None)
+
+    # foobar has no services_dir
+    assert results[1][1] is None
+    assert results[1][2] is not None
+
+    self.assert_config_unchanged()
+
+  def test_run_template(self):
+    output_dir = os.path.join(temp_dir, "processed-{context}")
+    runner = ContextRunner(temp_path, "production", jobs=2)
+
+    def template(context, se):
+      return se.template("tag", "all", output_dir.format(context=context),
+                         engine="native", print_selectors=False)
+
+    results = runner.run(template, ["saas", "saas"])
+    assert [error for _, _, error in results] == [None, None]
+    assert os.path.isfile(os.path.join(temp_dir, "processed-saas", "redirector.yaml"))
+    self.assert_config_unchanged()
+
+  def test_run_label_jobs(self, monkeypatch):
+    # what --all-contexts label --jobs does: the contexts run on threads,
+    # which must not fork worker processes
+    def no_processes(*args, **kwargs):
+      raise AssertionError("worker processes forked from a context thread")
+    monkeypatch.setattr(workers, "Pool", no_processes)
+
+    input_dir = "tests/data/fixtures/template"
+    output_dir = os.path.join(temp_dir, "labeled-{context}-%s")
+    runner = ContextRunner(temp_path, jobs=2)
+
+    def label(context, se):
+      return se.label("all", input_dir, output_dir.format(context=context) % threading.current_thread().ident,
+                      print_selectors=False, jobs=2)
+
+    results = runner.run(label, ["saas", "saas"])
+    assert [error for _, _, error in results] == [None, None]
+
+    sequential_dir = tempfile.mkdtemp()
+    expected = runner.herder("saas").label("all", input_dir, sequential_dir, print_selectors=False)
+    assert [result for _, result, _ in results] == [expected, expected]
+
+    for f in os.listdir(sequential_dir):
+      labeled = [os.path.join(temp_dir, d, f) for d in os.listdir(temp_dir) if d.startswith("labeled-saas-")]
+      assert labeled and all(filecmp.cmp(path, os.path.join(sequential_dir, f), shallow=False) for path in labeled)
+
+  def test_process_map(self):
+    assert workers.process_map(abs, [-1, -2, 3], jobs=2) == [1, 2, 3]
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(workers.process_map(abs, [-1, -2], jobs=2)))
+    thread.start()
+    thread.join()
+    assert results == [[1, 2]]
+
+  def test_run_exit(self):
+    runner = ContextRunner(temp_path)
+    results = runner.run(lambda context, se: sys.exit(1), ["saas"])
+
+    assert "exited with status 1" in str(results[0][2])
+
+  def test_unknown_context(self):
+    runner = ContextRunner(temp_path)
+    with pytest.raises(Exception):
+      runner.resolve(["saas", "nope"])
@@ -0,0 +1,144 @@
+import re
+import tempfile
+import threading
+import time
+
+from cache import ImageDigestCache
+from imagecheck import ImageChecker, ImageInspectError, RetryBudget, registry, template_images
+
+fixtures_dir = "tests/data/fixtures"
+
+
+class FakeInspector(object):
+  """ Registry stand-in: images maps image -> digest, private registries
+      need auth, flaky images fail that many times first """
+
+  def __init__(self, images, private=(), flaky=None, delay=0):
+    self.images = images
+    self.private = private
+    self.flaky = dict(flaky or {})
+    self.delay = delay
+    self.calls = []
+    self.lock = threading.Lock()
+
+  def inspect(self, image, auth=False, timeout=None):
+    time.sleep(self.delay)
+    with self.lock:
+      self.calls.append((image, auth))
+      if self.flaky.get(image):
+        self.flaky[image] -= 1
+        raise ImageInspectError("connection reset")
+
+    if registry(image) in self.private and not auth:
+      raise ImageInspectError("unauthorized")
+    if image not in self.images:
+      raise ImageInspectError("manifest unknown", retryable=False)
+
+    return self.images[image]
+
+
+class TestImageCheck(object):
+  def test_registry(self):
+    assert registry("quay.io/app-sre/quay:latest") == "quay.io"
+    assert registry("localhost:5000/foo") == "localhost:5000"
+    assert registry("centos/nginx") == "docker.io"
+    assert registry("nginx:latest") == "docker.io"
+
+  def test_template_images(self):
+    assert template_images(fixtures_dir + "/customresource/cs-image-pass.yaml") == \
+        set(["quay.io/app-sre/quay:latest"])
+    assert "registry.centos.org/mattermost/nginx-redirector:abcdef7" in \
+        template_images(fixtures_dir + "/template/hash_length.yaml")
+
+  def test_check_all(self):
+    inspector = FakeInspector({"quay.io/a:1": "sha256:1", "quay.io/b:1": "sha256:2"})
+    checker = ImageChecker(inspector, jobs=4, backoff=0)
+
+    results = checker.check_all(["quay.io/b:1", "quay.io/a:1", "quay.io/missing:1", "quay.io/a:1"])
+
+    assert results == [("OK", "quay.io/a:1", "sha256:1"),
+                       ("OK", "quay.io/b:1", "sha256:2"),
+                       ("ERROR", "quay.io/missing:1", "manifest unknown")]
+
+  def test_pattern(self):
+    checker = ImageChecker(FakeInspector({"quay.io/a:1": "d"}), pattern=re.compile("^quay.io/app-sre/"))
+    assert checker.check_all(["quay.io/a:1"])[0][0] == "ERROR_NO_MATCH"
+
+  def test_auth_memo(self):
+    images = dict(("private.io/image-%s:1" % i, "d%s" % i) for i in range(5))
+    inspector = FakeInspector(images, private=["private.io"])
+    checker = ImageChecker(inspector, jobs=1, backoff=0)
+
+    assert all(status == "OK" for status, _, _ in checker.check_all(images))
+    # only the first image is tried without auth
+    assert [auth for _, auth in inspector.calls] == [False, True, True, True, True, True]
+
+  def test_retry_budget(self):
+    flaky = dict(("quay.io/flaky-%s:1" % i, 100) for i in range(4))
+    inspector = FakeInspector(dict((image, "d") for image in flaky), flaky=flaky)
+    checker = ImageChecker(inspector, jobs=2, retries=3, backoff=0)
+
+    results = checker.check_all(flaky)
+    assert [status for status, _, _ in results] == ["ERROR"] * 4
+    # 4 attempts and 3 retries, each without and with auth
+    assert len(inspector.calls) == (4 + 3) * 2
+
+    budget = RetryBudget(retries=1, timeout=60)
+    assert budget.take()
+    assert not budget.take()
+    assert not RetryBudget(retries=5, timeout=0).take()
+
+  def test_slow_images_not_charged(self):
+    images = dict(("quay.io/slow-%s:1" % i, "d%s" % i) for i in range(20))
+    inspector = FakeInspector(images, delay=0.02)
+    # the first attempts take longer than the whole budget
+    checker = ImageChecker(inspector, jobs=2, timeout=0.05, backoff=0)
+
+    assert [status for status, _, _ in checker.check_all(images)] == ["OK"] * 20
+
+  def test_retry_time_budget(self):
+    flaky = dict(("quay.io/flaky-%s:1" % i, 100) for i in range(3))
+    inspector = FakeInspector(dict((image, "d") for image in flaky), flaky=flaky, delay=0.02)
+    checker = ImageChecker(inspector, jobs=1, retries=100, timeout=0.1, backoff=0)
+
+    results = checker.check_all(flaky)
+    assert [status for status, _, _ in results] == ["ERROR"] * 3
+    # every image got its first attempt, the retries stopped with the budget
+    assert set(image for image, _ in inspector.calls) == set(flaky)
+    assert len(inspector.calls) < 3 * 2 * 5
+
+  def test_digest_cache(self):
+    cache_dir = tempfile.mkdtemp()
+    images = {"quay.io/a:abcdef1": "sha256:1", "quay.io/a:latest": "sha256:2"}
+
+    inspector = FakeInspector(images)
+    ImageChecker(inspector, cache=ImageDigestCache(cache_dir)).check_all(images)
+    assert len(inspector.calls) == 2
+
+    # only the image tagged with a commit hash is served from the cache
+    inspector = FakeInspector(images)
+    results = ImageChecker(inspector, cache=ImageDigestCache(cache_dir)).check_all(images)
+    assert inspector.calls == [("quay.io/a:latest", False)]
+    assert ("OK", "quay.io/a:abcdef1", "sha256:1") in results
+
+    inspector = FakeInspector(images)
+    ImageChecker(inspector, cache=ImageDigestCache(cache_dir), refresh=True).check_all(images)
+    assert len(inspector.calls) == 2
+
+    inspector = FakeInspector(images)
+    ImageChecker(inspector, cache=ImageDigestCache(cache_dir, ttl=-1)).check_all(images)
+    assert len(inspector.calls) == 2
+
+  def test_digest_cache_is_pinned(self):
+    assert ImageDigestCache.is_pinned("quay.io/a:abcdef1")
+    assert ImageDigestCache.is_pinned("quay.io/a:1234a67")
+    assert ImageDigestCache.is_pinned("quay.io/a@sha256:" + "0" * 64)
+    # build numbers and dates can be pushed again
+    assert not ImageDigestCache.is_pinned("quay.io/a:123456")
+    assert not ImageDigestCache.is_pinned("quay.io/a:20181010")
+    assert not ImageDigestCache.is_pinned("quay.io/a:latest")
+
+  def test_digest_cache_failures_not_stored(self):
+    cache_dir = tempfile.mkdtemp()
+    ImageChecker(FakeInspector({}), cache=ImageDigestCache(cache_dir)).check_all(["quay.io/a:abcdef1"])
+    assert ImageDigestCache(cache_dir).get("quay.io/a:abcdef1") is None
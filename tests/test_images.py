@@ -0,0 +1,66 @@
+import time
+
+import images
+
+fixtures_dir = "tests/data/fixtures"
+
+
+def container(name, image):
+  return {"name": name, "image": image}
+
+
+def pod_spec(*images, **kwargs):
+  spec = {"containers": [container("c%s" % i, image) for i, image in enumerate(images)]}
+  if kwargs.get("init"):
+    spec["initContainers"] = [container("init", kwargs["init"])]
+  return {"metadata": {}, "spec": spec}
+
+
+class TestImages(object):
+  def test_pod_templates(self):
+    dc = {"kind": "DeploymentConfig", "spec": {"template": pod_spec("a")}}
+    cronjob = {"kind": "CronJob", "spec": {"jobTemplate": {"spec": {"template": pod_spec("b")}}}}
+    pod = dict(pod_spec("c"), kind="Pod")
+    custom = {"kind": "Rollout", "spec": {"template": pod_spec("d")}}
+    service = {"kind": "Service", "spec": {"ports": []}}
+
+    assert images.pod_templates(dc) == [dc["spec"]["template"]]
+    assert images.pod_templates(cronjob) == [cronjob["spec"]["jobTemplate"]["spec"]["template"]]
+    assert images.pod_templates(pod) == [pod]
+    assert images.pod_templates(custom) == [custom["spec"]["template"]]
+    assert images.pod_templates(service) == []
+
+  def test_containers(self):
+    dc = {"kind": "DeploymentConfig", "spec": {"template": pod_spec("a", "b", init="i")}}
+
+    assert [c["image"] for c in images.containers(dc)] == ["a", "b", "i"]
+    assert [c["image"] for c in images.containers(dc, init=False)] == ["a", "b"]
+
+  def test_all_images(self):
+    objects = [
+      {"kind": "Deployment", "spec": {"template": pod_spec("a", init="init")}},
+      {"kind": "CronJob", "spec": {"jobTemplate": {"spec": {"template": pod_spec("cron")}}}},
+      {"kind": "BuildConfig", "spec": {
+        "output": {"to": {"kind": "DockerImage", "name": "output"}},
+        "strategy": {"dockerStrategy": {"from": {"kind": "ImageStreamTag", "name": "base:latest"}}}}},
+      {"kind": "ImageStream", "spec": {"tags": [{"from": {"kind": "DockerImage", "name": "tagged"}},
+                                                {"name": "no-from"}]}},
+      {"kind": "CatalogSource", "spec": {"image": "catalog"}},
+      {"kind": "Service", "spec": {"ports": [{"port": 80}]}},
+      {"kind": "DeploymentConfig", "spec": {"template": {"spec": {"containers": None}}}},
+    ]
+
+    assert images.all_images(objects) == set(["a", "init", "cron", "output", "tagged", "catalog"])
+    assert images.container_images(objects) == ["a", "cron", "init"]
+
+  def test_objects_by_kind(self):
+    objects = [{"kind": "Service"}, {"kind": "DeploymentConfig"}, {"kind": "Service"}]
+    assert [len(v) for k, v in sorted(images.objects_by_kind(objects).items())] == [1, 2]
+
+  def test_many_objects(self):
+    objects = [{"kind": "DeploymentConfig", "spec": {"template": pod_spec("image-%s" % (i % 100))}}
+               for i in range(20000)]
+
+    start = time.time()
+    assert len(images.all_images(objects)) == 100
+    assert time.time() - start < 5
@@ -0,0 +1,96 @@
+import os
+import tempfile
+from shutil import copytree, copyfile
+
+import inventory as inventory_module
+from config import SaasConfig
+from inventory import ImageInventory
+
+temp_dir = tempfile.mkdtemp()
+tests_dir = os.path.join(temp_dir, 'tests', 'data')
+temp_path = os.path.join(temp_dir, "config.yaml")
+
+
+class TestImageInventory(object):
+  def setup_method(self, method):
+    copyfile("tests/data/config.yaml", temp_path)
+    if not os.path.isdir(tests_dir):
+      copytree("tests/data", tests_dir)
+
+  def images(self, rows):
+    return dict((r["service"], r["image"]) for r in rows)
+
+  def test_rows_from_templates(self):
+    inventory = ImageInventory(temp_path, repo="saas-repo", jobs=2)
+    rows = list(inventory.rows(["saas"]))
+
+    assert rows[0] == {"repo": "saas-repo", "context": "saas", "service": "hash_length",
+                       "url": "https://github.com/openshiftio/saas-openshiftio/",
+                       "hash": "abcdef7hijk",
+                       "image": "registry.centos.org/mattermost/nginx-redirector:abcdef7"}
+    assert self.images(rows)["redirector"] == "some_image:abcdef"
+    assert inventory.failed_contexts == []
+
+  def test_rows_environment(self):
+    inventory = ImageInventory(temp_path, environment="production")
+    assert self.images(inventory.rows(["saas"]))["redirector"] == "production_image:abcdef"
+
+  def test_rows_from_processed(self):
+    inventory = ImageInventory(temp_path, source="processed",
+                               input_dir=os.path.join(tests_dir, "fixtures", "template"))
+    assert self.images(inventory.rows(["saas"]))["redirector"] == "some_image:abcdef"
+
+  def test_all_contexts_config_unchanged(self):
+    with open(temp_path) as fp:
+      config = fp.read()
+
+    inventory = ImageInventory(temp_path)
+    rows = list(inventory.rows())
+
+    assert set(r["context"] for r in rows) == set(["saas"])
+    assert inventory.failed_contexts == ["foobar"]
+    with open(temp_path) as fp:
+      assert fp.read() == config
+
+  def test_failed_service(self):
+    templates_dir = os.path.join(temp_dir, "broken-templates")
+    copytree(os.path.join(tests_dir, "template"), templates_dir)
+    # a required parameter without a value
+    with open(os.path.join(templates_dir, "hash_length.yaml"), "a") as fp:
+      fp.write("  - name: REQUIRED\n    required: true\n")
+
+    config = SaasConfig(temp_path)
+    config.add_context("broken", "tests/data/service", "broken-templates", "broken-processed")
+    inventory = ImageInventory(temp_path, jobs=2)
+    rows = list(inventory.rows(["broken"]))
+
+    # the other services of the context are listed
+    services = [r["service"] for r in rows]
+    assert "hash_length" not in services
+    assert "redirector" in services
+    assert inventory.failed_contexts == ["broken"]
+
+  def test_parsed_templates_bounded(self, monkeypatch):
+    parsed = []
+    parse_file = inventory_module.yamlio.parse_file
+
+    def parse_template(path, **kwargs):
+      if os.path.basename(os.path.dirname(path)) == "template":
+        parsed.append(path)
+      return parse_file(path, **kwargs)
+
+    monkeypatch.setattr(inventory_module.yamlio, "parse_file", parse_template)
+
+    inventory = ImageInventory(temp_path)
+    rows = list(inventory.rows(["saas", "saas"]))
+    templates = len(parsed)
+
+    # the second context reuses the templates of the first
+    assert len(rows) == 2 * len(self.images(rows))
+    assert templates == len(inventory._parsed)
+
+    del parsed[:]
+    inventory = ImageInventory(temp_path, cache_size=1)
+    assert list(inventory.rows(["saas", "saas"])) == rows
+    assert len(inventory._parsed) == 1
+    assert len(parsed) == 2 * templates
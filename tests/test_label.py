@@ -1,7 +1,10 @@
 import os
 import filecmp
 import tempfile
+import anymarkup
+from StringIO import StringIO
 from saasherder import SaasHerder
+import labels
 from shutil import copytree, copyfile
 
 templates_dir = "tests/data/fixtures/template"
@@ -73,3 +76,96 @@ class TestLabeling(object):
     lines = [x.strip() for x in lines]
     for i in range(len(lines)):
         assert lines[i] == label_selectors[i]
+
+  def test_label_hashes_once(self, monkeypatch):
+    hashed = []
+    sha256sum_short = labels.sha256sum_short
+
+    def counting_sha256sum_short(data):
+      hashed.append(data)
+      return sha256sum_short(data)
+
+    se = SaasHerder(temp_path, None)
+    label_selectors = se.label("all", templates_dir, tempfile.mkdtemp())
+
+    monkeypatch.setattr(labels, "sha256sum_short", counting_sha256sum_short)
+    assert se.label("all", templates_dir, tempfile.mkdtemp()) == label_selectors
+    # one digest per service, shared by its labels, pod labels and selector
+    assert len(hashed) == len(se.services)
+
+  def test_label_jobs(self, capsys):
+    se = SaasHerder(temp_path, None)
+    sequential_dir = tempfile.mkdtemp()
+    label_selectors = se.label("all", templates_dir, sequential_dir,
+                               saas_repo_url='https://github.com/app-sre/saas-test')
+    sequential_out = capsys.readouterr()[0]
+
+    output_dir = tempfile.mkdtemp()
+    assert se.label("all", templates_dir, output_dir, jobs=3,
+                    saas_repo_url='https://github.com/app-sre/saas-test') == label_selectors
+    assert capsys.readouterr()[0] == sequential_out
+
+    for f in os.listdir(sequential_dir):
+      assert filecmp.cmp(os.path.join(output_dir, f), os.path.join(sequential_dir, f))
+
+  def test_label_set(self):
+    se = SaasHerder(temp_path, None)
+    s = se.get_services("all")[0]
+    labels, pod_labels, label_selector = se.get_saasherder_label_set(s, "url", se.sha256sum_short("data"),
+                                                                     current=False)
+
+    assert labels == se.get_saasherder_labels("data", s, "url")
+    assert pod_labels == se.get_saasherder_labels("data", s, "url", pod_labels=True)
+    assert label_selector == se.get_saasherder_label_selector("data", s, "url", current=False)
+
+  def test_label_stream(self):
+    output_dir = tempfile.mkdtemp()
+    se = SaasHerder(temp_path, None)
+    label_selectors = se.label("all", templates_dir, output_dir,
+                               saas_repo_url='https://github.com/app-sre/saas-test', stream=True)
+
+    assert label_selectors == se.label("all", templates_dir, tempfile.mkdtemp(),
+                                       saas_repo_url='https://github.com/app-sre/saas-test')
+    for f in os.listdir(output_dir):
+      assert filecmp.cmp(os.path.join(output_dir, f), os.path.join(fixtures_dir_with_repo_url, f))
+
+  def test_label_stream_in_place(self):
+    output_dir = tempfile.mkdtemp()
+    for f in os.listdir(templates_dir):
+      copyfile(os.path.join(templates_dir, f), os.path.join(output_dir, f))
+
+    se = SaasHerder(temp_path, None)
+    se.label("all", output_dir=output_dir, stream=True)
+
+    assert sorted(os.listdir(output_dir)) == sorted(os.listdir(templates_dir))
+    for f in os.listdir(output_dir):
+      assert filecmp.cmp(os.path.join(output_dir, f), os.path.join(fixtures_dir, f))
+
+  def test_stream_objects_filter(self):
+    se = SaasHerder(temp_path, None)
+    for f in os.listdir(templates_dir):
+      with open(os.path.join(templates_dir, f)) as fp:
+        data = fp.read()
+
+      output = StringIO()
+      with open(os.path.join(templates_dir, f)) as fp:
+        se.stream_objects(fp, output, template_filter=["Route"])
+      assert output.getvalue() == se.apply_filter(["Route"], data)
+
+  def test_template_label_single_pass(self):
+    se = SaasHerder(temp_path, None)
+    templated_dir = tempfile.mkdtemp()
+    se.template("tag", "all", templated_dir, template_filter=["Route"], engine="native")
+    labeled_dir = tempfile.mkdtemp()
+    label_selectors = se.label("all", templated_dir, labeled_dir,
+                               saas_repo_url='https://github.com/app-sre/saas-test')
+
+    output_dir = tempfile.mkdtemp()
+    assert se.template("tag", "all", output_dir, template_filter=["Route"], engine="native",
+                       label=True, saas_repo_url='https://github.com/app-sre/saas-test') == label_selectors
+    assert len(label_selectors) == len(se.services)
+
+    # same files, digest labels included, as template followed by label
+    assert sorted(os.listdir(output_dir)) == sorted(os.listdir(labeled_dir))
+    for f in os.listdir(output_dir):
+      assert filecmp.cmp(os.path.join(output_dir, f), os.path.join(labeled_dir, f), shallow=False)
@@ -0,0 +1,109 @@
+import os
+import filecmp
+import random
+import tempfile
+import pytest
+import anymarkup
+from saasherder import SaasHerder, ProcessingError
+from processor import TemplateProcessor, TemplateProcessingError, generate_expression
+from shutil import copytree, copyfile
+
+fixtures_dir = "tests/data/fixtures/template"
+
+temp_dir = tempfile.mkdtemp()
+tests_dir = os.path.join(temp_dir, 'tests', 'data')
+temp_path = os.path.join(temp_dir, "config.yaml")
+
+template = {
+  "kind": "Template",
+  "objects": [{
+    "kind": "DeploymentConfig",
+    "metadata": {"name": "${NAME}"},
+    "spec": {"replicas": "${{REPLICAS}}", "image": "image:${IMAGE_TAG}",
+             "quoted": "${REPLICAS}", "unknown": "${UNKNOWN}"},
+  }],
+  "parameters": [
+    {"name": "NAME", "required": True},
+    {"name": "REPLICAS", "value": "1"},
+    {"name": "IMAGE_TAG", "value": "latest"},
+    {"name": "SECRET", "generate": "expression", "from": "[a-f0-9]{16}"},
+  ],
+}
+
+
+class TestNativeProcessor(object):
+  def setup_method(self, method):
+    copyfile("tests/data/config.yaml", temp_path)
+    if not os.path.isdir(tests_dir):
+      copytree("tests/data", tests_dir)
+
+  def test_processed_files_match_oc(self):
+    output_dir = tempfile.mkdtemp()
+    se = SaasHerder(temp_path, None)
+    se.template("tag", "all", output_dir, template_filter=["Route"], engine="native")
+
+    files = [f for f in os.listdir(output_dir) if f.endswith("yaml")]
+    assert len(files) == len(os.listdir(fixtures_dir))
+    for f in files:
+      assert filecmp.cmp(os.path.join(output_dir, f), os.path.join(fixtures_dir, f), shallow=False)
+
+  def test_failures_collected(self):
+    templates_dir = tempfile.mkdtemp()
+    for f in os.listdir("tests/data/template"):
+      if f != "redirector.yaml":
+        copyfile(os.path.join("tests/data/template", f), os.path.join(templates_dir, f))
+    with open(os.path.join(templates_dir, "hash_length.yaml"), "w") as fp:
+      fp.write("objects: [\n")
+
+    output_dir = tempfile.mkdtemp()
+    se = SaasHerder(temp_path, None)
+    se.templates_dir = templates_dir
+
+    with pytest.raises(ProcessingError) as e:
+      se.template("tag", "all", output_dir, engine="native", jobs=2)
+
+    # a missing and a broken template, the other services are processed
+    assert sorted(name for name, _ in e.value.failures) == ["hash_length", "redirector"]
+    assert sorted(os.listdir(output_dir)) == ["labeled.yaml", "multiple_services.yaml", "redirector-ignore.yaml"]
+
+  def test_environment_parameters(self):
+    output_dir = tempfile.mkdtemp()
+    se = SaasHerder(temp_path, None, "production")
+    se.template("tag", "redirector", output_dir, engine="native", jobs=2)
+    data = anymarkup.parse_file(os.path.join(output_dir, "redirector.yaml"))
+    assert data["kind"] == "List"
+    for item in data["items"]:
+      if item["kind"] == "DeploymentConfig":
+        image = item["spec"]["template"]["spec"]["containers"][0]["image"]
+        assert image == "production_image:abcdef"
+
+  def test_substitution(self):
+    parameters = [{"name": "NAME", "value": "foo"}, {"name": "REPLICAS", "value": "3"}]
+    result = TemplateProcessor().process(template, parameters)
+    spec = result["items"][0]["spec"]
+    assert result["items"][0]["metadata"]["name"] == "foo"
+    assert spec["replicas"] == 3
+    assert spec["quoted"] == "3"
+    assert spec["image"] == "image:latest"
+    assert spec["unknown"] == "${UNKNOWN}"
+
+  def test_required(self):
+    with pytest.raises(TemplateProcessingError):
+      TemplateProcessor().process(template, [])
+
+  def test_unknown_parameters(self):
+    parameters = [{"name": "NAME", "value": "foo"}, {"name": "FOO", "value": "bar"}]
+    with pytest.raises(TemplateProcessingError):
+      TemplateProcessor().process(template, parameters)
+    assert TemplateProcessor(ignore_unknown_parameters=True).process(template, parameters)
+
+  def test_generate_expression(self):
+    processor = TemplateProcessor()
+    values = processor.resolve_parameters(template, [{"name": "NAME", "value": "foo"}])
+    assert len(values["SECRET"]) == 16
+    assert set(values["SECRET"]) <= set("abcdef0123456789")
+
+    value = generate_expression("x\\d{3}[A-C]{2}", random.Random(0))
+    assert value[0] == "x"
+    assert value[1:4].isdigit()
+    assert set(value[4:]) <= set("ABC")
@@ -5,6 +5,8 @@ import anymarkup
 from shutil import copytree, copyfile
 
 from saasherder import SaasHerder
+from config import SaasConfig
+from manifest import PullManifest
 
 temp_dir = tempfile.mkdtemp()
 tests_dir = os.path.join(temp_dir, 'tests', 'data')
@@ -23,7 +25,7 @@ class TestSH(object):
 
   def test_sh_services_num(self):
     sh = SaasHerder(temp_path, None)
-    assert len(sh.services) == 4
+    assert len(sh.services) == 5
 
   def test_sh_get_services(self):
     sh = SaasHerder(temp_path, None)
@@ -33,6 +35,20 @@ class TestSH(object):
     sh = SaasHerder(temp_path, None)
     assert len(sh.get_services("all")) == len(sh.services)
 
+  def test_sh_switch_context(self):
+    SaasConfig(temp_path).add_context("other", "tests/data/service", "tests/data/template", "other-processed")
+    with open(temp_path) as fp:
+      config = fp.read()
+
+    sh = SaasHerder(temp_path, "other", persist_context=False)
+    assert os.path.basename(sh.output_dir) == "other-processed"
+    sh.switch_context("saas")
+    assert os.path.basename(sh.output_dir) == "saas-processed"
+    assert len(sh.services) == 5
+
+    with open(temp_path) as fp:
+      assert fp.read() == config
+
   def test_sh_get_hash_lenght(self):
     sh = SaasHerder(temp_path, None)
     assert sh.get("hash_length", ["hash_length"])[0] == 7
@@ -49,4 +65,80 @@ class TestSH(object):
     assert len(data["services"]) == 2
     assert data["services"][1]["hash"] == "master"
 
+  def test_sh_collect_services_jobs(self):
+    sh = SaasHerder(temp_path, None)
+    sh.templates_dir = tempfile.mkdtemp()
+    sh.download_template = lambda s, token, **kwargs: "name: %s\n" % s["name"]
+    sh.collect_services("all", jobs=4)
+    assert sorted(os.listdir(sh.templates_dir)) == \
+        sorted("%s.yaml" % name for name in sh.services)
+
+  def test_sh_collect_services_jobs_fail_on_error(self):
+    sh = SaasHerder(temp_path, None)
+    sh.templates_dir = tempfile.mkdtemp()
+
+    def download_template(s, token, **kwargs):
+      if s["name"] == "redirector":
+        raise Exception("Couldn't pull the template.")
+      return "name: %s\n" % s["name"]
+
+    sh.download_template = download_template
+    sh.collect_services("all", jobs=4)
+    assert "redirector.yaml" not in os.listdir(sh.templates_dir)
+    assert len(os.listdir(sh.templates_dir)) == len(sh.services) - 1
+
+    with pytest.raises(Exception) as e:
+      sh.collect_services("all", fail_on_error=True, jobs=4)
+    # raised with the traceback of the worker
+    assert "Couldn't pull the template." in str(e.value)
+    assert e.traceback[-1].name == "download_template"
 
+  def test_sh_collect_services_incremental(self):
+    sh = SaasHerder(temp_path, None)
+    sh.templates_dir = tempfile.mkdtemp()
+    sh.services["redirector"]["hash"] = "aab9fc5fa5c24360079998f2209b2b55c3af29ae"
+    downloaded = []
+
+    def download_template(s, token, **kwargs):
+      downloaded.append(s["name"])
+      return "name: %s\n" % s["name"]
+
+    sh.download_template = download_template
+    manifest = PullManifest(sh.templates_dir)
+    sh.collect_services("all", manifest=manifest, incremental=True)
+    assert len(downloaded) == len(sh.services)
+    assert os.path.exists(sh.templates_dir + ".manifest.json")
+
+    # only the pinned service is up to date, branch refs are pulled again
+    del downloaded[:]
+    sh.collect_services("all", manifest=PullManifest(sh.templates_dir), incremental=True)
+    assert "redirector" not in downloaded
+    assert len(downloaded) == len(sh.services) - 1
+
+    os.remove(os.path.join(sh.templates_dir, "redirector.yaml"))
+    sh.collect_services("all", manifest=PullManifest(sh.templates_dir), incremental=True)
+    assert "redirector" in downloaded
+
+  def test_sh_verify_templates(self):
+    sh = SaasHerder(temp_path, None)
+    sh.templates_dir = tempfile.mkdtemp()
+    sh.download_template = lambda s, token, **kwargs: "name: %s\n" % s["name"]
+    manifest = PullManifest(sh.templates_dir)
+    sh.collect_services("all", manifest=manifest)
+    assert sh.verify_templates("all", manifest) == (True, {})
+
+    with open(os.path.join(sh.templates_dir, "redirector.yaml"), "w") as fp:
+      fp.write("changed\n")
+    sh.services["hash_length"]["hash"] = "master"
+    ok, errors = sh.verify_templates("all", manifest)
+    assert not ok
+    assert sorted(errors.keys()) == ["hash_length", "redirector"]
+
+  def test_sh_get_fields(self):
+    sh = SaasHerder(temp_path, None)
+    rows = sh.get_fields(["name", "hash", "hash_length"], "all")
+    assert len(rows) == len(sh.services)
+    for row in rows:
+      assert row["hash"] == sh.services[row["name"]]["hash"]
+    assert sh.get_fields(["name", "hash_length"], ["hash_length", "redirector"]) == \
+        [{"name": "hash_length", "hash_length": 7}, {"name": "redirector", "hash_length": 6}]
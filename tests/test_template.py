@@ -128,3 +128,13 @@ class TestTemplating(object):
       if item["kind"] == "DeploymentConfig":
         assert item["spec"]["template"]["spec"]["containers"][0]["image"].endswith(
             ":latest")
+
+  def test_template_processed_files_jobs(self):
+    output_dir = tempfile.mkdtemp()
+    se = SaasHerder(temp_path, None)
+    se.template("tag", "all", output_dir, local=True, template_filter=["Route"], jobs=4)
+
+    files = [f for f in os.listdir(output_dir) if f.endswith("yaml")]
+    assert len(files) == len(se.services)
+    for f in files:
+      assert filecmp.cmp(os.path.join(output_dir, f), os.path.join(fixtures_dir, f))
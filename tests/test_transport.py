@@ -0,0 +1,62 @@
+import threading
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+from transport import SessionPool
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+  # number of requests answered with 502 before the template is served
+  failures = 0
+  requests = 0
+
+  def do_GET(self):
+    FlakyHandler.requests += 1
+    if FlakyHandler.requests <= FlakyHandler.failures:
+      self.send_response(502)
+      self.send_header("Content-Length", "0")
+      self.end_headers()
+      return
+
+    body = "kind: Template\n"
+    self.send_response(200)
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, *args):
+    pass
+
+
+class TestSessionPool(object):
+  def setup_method(self, method):
+    FlakyHandler.failures = 0
+    FlakyHandler.requests = 0
+    self.server = HTTPServer(("127.0.0.1", 0), FlakyHandler)
+    self.url = "http://127.0.0.1:%s/template.yaml" % self.server.server_port
+    thread = threading.Thread(target=self.server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+  def teardown_method(self, method):
+    self.server.shutdown()
+    self.server.server_close()
+
+  def test_session_per_host(self):
+    pool = SessionPool()
+    assert pool.session(self.url) is pool.session(self.url + "?other")
+    assert pool.session(self.url) is not pool.session("https://example.com/x")
+
+  def test_retry_on_bad_gateway(self):
+    FlakyHandler.failures = 2
+    pool = SessionPool(retries=3, backoff_factor=0)
+    r = pool.get(self.url)
+    assert r.status_code == 200
+    assert r.content == "kind: Template\n"
+    assert FlakyHandler.requests == 3
+
+  def test_retries_exhausted(self):
+    FlakyHandler.failures = 10
+    pool = SessionPool(retries=2, backoff_factor=0)
+    r = pool.get(self.url)
+    assert r.status_code == 502
+    assert FlakyHandler.requests == 3
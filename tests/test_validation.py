@@ -0,0 +1,81 @@
+import os
+import tempfile
+from shutil import copytree, copyfile
+
+import validation
+from cache import ValidationCache
+from saasherder import SaasHerder
+from validation import ContainerRequestsLimitsRule, ValidationEngine, validate_file
+
+temp_dir = tempfile.mkdtemp()
+tests_dir = os.path.join(temp_dir, 'tests', 'data')
+temp_path = os.path.join(temp_dir, "config.yaml")
+
+templates_dir = "tests/data/template"
+
+
+class TestValidation(object):
+  def setup_method(self, method):
+    copyfile("tests/data/config.yaml", temp_path)
+    if not os.path.isdir(tests_dir):
+      copytree("tests/data", tests_dir)
+
+  def templates(self):
+    return [os.path.join(templates_dir, f) for f in sorted(os.listdir(templates_dir))]
+
+  def test_validate_file_like_rules(self):
+    for path in self.templates():
+      template = validation.yamlio.parse_file(path)
+      assert validate_file(path) == ContainerRequestsLimitsRule(template).validate()
+
+  def test_engine_jobs(self):
+    results = ValidationEngine().validate(self.templates())
+
+    assert sorted(results) == self.templates()
+    assert ValidationEngine(jobs=3).validate(self.templates()) == results
+
+  def test_engine_cache(self, monkeypatch):
+    cache_dir = tempfile.mkdtemp()
+    results = ValidationEngine(cache=ValidationCache(cache_dir)).validate(self.templates())
+
+    validated = []
+    monkeypatch.setattr(validation, "validate_file", lambda path: validated.append(path) or [])
+
+    assert ValidationEngine(cache=ValidationCache(cache_dir)).validate(self.templates()) == results
+    assert validated == []
+
+    # results of another rule set version are not used
+    monkeypatch.setattr(validation, "RULESET_VERSION", validation.RULESET_VERSION + 1)
+    ValidationEngine(cache=ValidationCache(cache_dir)).validate(self.templates())
+    assert validated == self.templates()
+
+  def test_engine_broken_templates(self):
+    broken_dir = tempfile.mkdtemp()
+    broken = os.path.join(broken_dir, "broken.yaml")
+    with open(broken, "w") as fp:
+      fp.write("objects: [\n")
+    missing = os.path.join(broken_dir, "missing.yaml")
+
+    cache_dir = tempfile.mkdtemp()
+    paths = self.templates() + [broken, missing]
+    results = ValidationEngine(jobs=3, cache=ValidationCache(cache_dir)).validate(paths)
+
+    # the other templates are still validated
+    assert sorted(results) == sorted(paths)
+    assert results[self.templates()[0]] == validate_file(self.templates()[0])
+    assert results[broken][0].startswith("Could not validate %s" % broken)
+    assert results[missing][0].startswith("Could not validate %s" % missing)
+    # failures are not cached
+    entries = ValidationCache(cache_dir).entries
+    assert entries
+    assert not [e for e in entries.values() if "Could not validate" in "".join(e["errors"])]
+
+  def test_sh_validate(self):
+    se = SaasHerder(temp_path, None)
+    valid, errors = se.validate()
+
+    assert not valid
+    # the template of labeled has no containers
+    assert sorted(errors) == sorted(name for name, s in se.services.items()
+                                    if s.get("hash") and name != "labeled")
+    assert se.validate(jobs=2, cache=ValidationCache(tempfile.mkdtemp())) == (valid, errors)
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import anymarkup
+import pytest
+import yaml
+from StringIO import StringIO
+
+import yamlio
+
+service_dir = "tests/data/service"
+fixtures_dir = "tests/data/fixtures/template"
+
+multiline = {"data": {"config": "line 1\nline 2\n", "port": "8080", "replicas": 1}}
+
+
+class TestYamlIO(object):
+  def test_parse_file_like_anymarkup(self):
+    for f in os.listdir(service_dir):
+      path = os.path.join(service_dir, f)
+      assert yamlio.parse_file(path) == anymarkup.parse_file(path)
+      assert yamlio.parse_file(path, force_types=None) == \
+          anymarkup.parse_file(path, force_types=None)
+
+  def test_dump_like_processed_templates(self):
+    for f in os.listdir(fixtures_dir):
+      with open(os.path.join(fixtures_dir, f)) as fp:
+        data = fp.read()
+      assert yamlio.dump(yamlio.load(data)) == data
+
+    assert yamlio.dump(multiline) == \
+        yaml.dump(multiline, encoding='utf-8', default_flow_style=False)
+
+  def test_serialize_file_like_anymarkup(self):
+    path = os.path.join(tempfile.mkdtemp(), "out.yaml")
+    yamlio.serialize_file(multiline, path)
+    with open(path) as fp:
+      assert fp.read() == anymarkup.serialize(multiline, "yaml")
+
+  def test_parse_like_parse_file(self):
+    for f in os.listdir(service_dir):
+      path = os.path.join(service_dir, f)
+      with open(path) as fp:
+        data = fp.read()
+      assert yamlio.parse(data, f) == yamlio.parse_file(path)
+
+  def test_iter_list_and_list_writer(self):
+    for f in os.listdir(fixtures_dir):
+      data_obj = yamlio.parse_file(os.path.join(fixtures_dir, f), force_types=None)
+
+      output = StringIO()
+      with open(os.path.join(fixtures_dir, f)) as fp:
+        with yamlio.ListWriter(output, block_strings=True) as writer:
+          for kind, value in yamlio.iter_list(fp):
+            if kind == yamlio.ITEM:
+              writer.write_item(value)
+            else:
+              writer.write_field(*value)
+
+      assert writer.items == len(data_obj["items"])
+      assert output.getvalue() == yamlio.dump(data_obj, block_strings=True)
+
+  def test_list_writer_no_items(self):
+    output = StringIO()
+    with yamlio.ListWriter(output) as writer:
+      writer.write_field("kind", "List")
+      writer.write_field("apiVersion", "v1")
+
+    assert output.getvalue() == yamlio.dump({"apiVersion": "v1", "items": [], "kind": "List"})
+
+  def test_iter_list_not_a_list(self):
+    with pytest.raises(Exception):
+      list(yamlio.iter_list(StringIO("- a\n- b\n")))